@@ -0,0 +1,31 @@
+from hashlib import md5
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    return f'"{md5(repr(parts).encode()).hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    return etag in (tag[2:] if tag.startswith('W/') else tag
+                    for tag in etags)
+
+
+def set_etag(response, etag):
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def not_modified(etag):
+    return set_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from recipes.catalog import ingredient_catalog, tag_catalog
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from .serializers import RECIPE_DATETIME_FORMAT, image_variant_urls
+
+# Поля строки, из которых serialize_recipe_rows собирает ответ.
+RECIPE_ROW_FIELDS = (
+    'pk', 'name', 'image', 'image_variants', 'description', 'cooking_time',
+    'created_at', 'author_id', 'author__email', 'author__username',
+    'author__first_name', 'author__last_name', 'author__avatar',
+    'author__avatar_variants',
+)
+
+
+def _file_url(name, request):
+    # Как FileField.to_representation для хранилища по умолчанию.
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def _load_missing(catalog_rows, model, fields):
+    missing = [pk for pk, row in catalog_rows.items() if row is None]
+    if missing:
+        for row in model.objects.filter(pk__in=missing).values(*fields):
+            catalog_rows[row['id']] = row
+
+
+def serialize_recipe_rows(rows, request):
+    # Тот же вывод, что у RecipeListSerializer(many=True), но из строк
+    # values_list и снимков справочников, без вложенных сериализаторов.
+    recipe_ids = [row.pk for row in rows]
+    tag_ids = defaultdict(list)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids).order_by('tag_id').values_list(
+                'recipe_id', 'tag_id'):
+        tag_ids[recipe_id].append(tag_id)
+    amounts = defaultdict(list)
+    for recipe_id, ingredient_id, amount in IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+                'recipe_id', 'ingredient_id', 'amount'):
+        amounts[recipe_id].append((ingredient_id, amount))
+
+    tags = tag_catalog.get_many(
+        {tag_id for ids in tag_ids.values() for tag_id in ids}
+    )
+    _load_missing(tags, Tag, ('id', 'name', 'slug'))
+    ingredients = ingredient_catalog.get_many(
+        {ingredient_id for items in amounts.values()
+         for ingredient_id, _ in items}
+    )
+    _load_missing(ingredients, Ingredient,
+                  ('id', 'name', 'measurement_unit'))
+
+    authenticated = request.user.is_authenticated
+    created_at = serializers.DateTimeField(format=RECIPE_DATETIME_FORMAT)
+    data = []
+    for row in rows:
+        data.append({
+            'id': row.pk,
+            'tags': [dict(tags[tag_id]) for tag_id in tag_ids[row.pk]],
+            'author': {
+                'email': row.author__email,
+                'id': row.author_id,
+                'username': row.author__username,
+                'first_name': row.author__first_name,
+                'last_name': row.author__last_name,
+                'is_subscribed': (authenticated
+                                  and row.author_is_subscribed),
+                'avatar': _file_url(row.author__avatar, request),
+                'avatar_variants': image_variant_urls(
+                    row.author__avatar_variants, request
+                ),
+            },
+            'ingredients': [{**ingredients[ingredient_id], 'amount': amount}
+                            for ingredient_id, amount in amounts[row.pk]],
+            'is_favorited': authenticated and row.is_favorited,
+            'is_in_shopping_cart': (authenticated
+                                    and row.is_in_shopping_cart),
+            'name': row.name,
+            'image': _file_url(row.image, request),
+            'image_variants': image_variant_urls(row.image_variants,
+                                                 request),
+            'description': row.description,
+            'cooking_time': row.cooking_time,
+            'created_at': created_at.to_representation(row.created_at),
+        })
+    return data
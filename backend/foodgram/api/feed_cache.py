@@ -0,0 +1,13 @@
+from hashlib import md5
+
+FEED_CACHE_KEY_PREFIX = 'recipes:feed'
+
+
+def get_feed_cache_key(request, catalog_version):
+    params = sorted(
+        (key, sorted(values)) for key, values in request.query_params.lists()
+    )
+    digest = md5(
+        repr((request.scheme, request.get_host(), params)).encode()
+    ).hexdigest()
+    return f'{FEED_CACHE_KEY_PREFIX}:{catalog_version}:{digest}'
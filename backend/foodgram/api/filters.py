@@ -0,0 +1,13 @@
+from rest_framework.filters import BaseFilterBackend
+
+from recipes.search import search_recipes
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return search_recipes(queryset, text)
@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+
+User = get_user_model()
+
+DEFAULT_LIMIT = 60
+DEFAULT_REPEAT = 50
+
+
+def get_list_view(username=None):
+    # Представление ленты рецептов вне HTTP-запроса, как для GET
+    # /api/recipes/ от имени пользователя или анонима.
+    request = APIRequestFactory().get('/api/recipes/')
+    if username:
+        try:
+            force_authenticate(request, User.objects.get(username=username))
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {username} не найден.')
+    view = RecipeViewSet(action='list', action_map={'get': 'list'},
+                         format_kwarg=None, kwargs={})
+    view.request = view.initialize_request(request)
+    return view
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает сборку страницы рецептов из строк values_list '
+            '(FAST_RECIPE_SERIALIZER) и через RecipeListSerializer '
+            'на данных текущей базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                            help='Рецептов на странице.')
+        parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                            help='Прогонов каждого способа.')
+        parser.add_argument('--username',
+                            help='Собирать страницу от имени пользователя '
+                                 '(по умолчанию — аноним).')
+
+    def handle(self, *args, **options):
+        view = get_list_view(options['username'])
+        queryset = view.filter_queryset(view.get_queryset())
+        rows = list(view._get_recipe_rows(queryset)[:options['limit']])
+        if not rows:
+            raise CommandError('В базе нет рецептов.')
+
+        rendered = {}
+        for fast, label in ((True, 'строки values_list'),
+                            (False, 'RecipeListSerializer')):
+            timings = []
+            with override_settings(FAST_RECIPE_SERIALIZER=fast):
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    data = view._serialize_rows(rows, queryset)
+                    timings.append(time.perf_counter() - started)
+            rendered[fast] = JSONRenderer().render(data)
+            self.stdout.write(
+                f'{label}: медиана {statistics.median(timings) * 1000:.2f} '
+                f'мс, минимум {min(timings) * 1000:.2f} мс '
+                f'({len(rows)} рецептов)'
+            )
+
+        if rendered[True] != rendered[False]:
+            raise CommandError('Ответы двух способов различаются.')
+        self.stdout.write(self.style.SUCCESS('Ответы совпадают.'))
@@ -0,0 +1,57 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import serialize_recipe_rows
+from api.management.commands.benchmark_recipe_serializers import (
+    DEFAULT_LIMIT, DEFAULT_REPEAT, get_list_view)
+from api.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает рендеринг страницы рецептов FastJSONRenderer '
+            '(orjson) и JSONRenderer на данных текущей базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                            help='Рецептов на странице.')
+        parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                            help='Прогонов каждого рендерера.')
+        parser.add_argument('--username',
+                            help='Собирать страницу от имени пользователя '
+                                 '(по умолчанию — аноним).')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson не установлен: FastJSONRenderer работает как '
+                'JSONRenderer.'
+            ))
+        view = get_list_view(options['username'])
+        queryset = view.filter_queryset(view.get_queryset())
+        rows = list(view._get_recipe_rows(queryset)[:options['limit']])
+        if not rows:
+            raise CommandError('В базе нет рецептов.')
+        data = {'count': len(rows), 'next': None, 'previous': None,
+                'results': serialize_recipe_rows(rows, view.request)}
+
+        rendered = {}
+        for renderer in (FastJSONRenderer(), JSONRenderer()):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                output = renderer.render(data)
+                timings.append(time.perf_counter() - started)
+            rendered[type(renderer)] = output
+            self.stdout.write(
+                f'{type(renderer).__name__}: медиана '
+                f'{statistics.median(timings) * 1000:.2f} мс, минимум '
+                f'{min(timings) * 1000:.2f} мс '
+                f'({len(output)} байт, {len(rows)} рецептов)'
+            )
+
+        if len(set(rendered.values())) != 1:
+            raise CommandError('Вывод рендереров различается.')
+        self.stdout.write(self.style.SUCCESS('Вывод совпадает.'))
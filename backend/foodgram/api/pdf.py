@@ -0,0 +1,377 @@
+import re
+import struct
+import zlib
+from functools import lru_cache
+from pathlib import Path
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+PAGE_MARGIN = 50
+LINE_SPACING = 1.4
+SUBSET_TAG = 'FGAAAA'
+SUBSET_TABLES = (b'cvt ', b'fpgm', b'glyf', b'head', b'hhea', b'hmtx',
+                 b'loca', b'maxp', b'prep')
+TO_UNICODE_BLOCK = 100
+
+# Флаги составного глифа (таблица glyf).
+ARG_1_AND_2_ARE_WORDS = 0x0001
+WE_HAVE_A_SCALE = 0x0008
+MORE_COMPONENTS = 0x0020
+WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+WE_HAVE_A_TWO_BY_TWO = 0x0080
+
+# Номера постоянных объектов; страницы нумеруются после них.
+CATALOG_ID, PAGES_ID, FONT_ID, CID_FONT_ID, DESCRIPTOR_ID, FONT_FILE_ID, \
+    TO_UNICODE_ID = range(1, 8)
+FIRST_PAGE_ID = 8
+
+
+def _checksum(data):
+    data += b'\0' * (-len(data) % 4)
+    return sum(struct.unpack(f'>{len(data) // 4}I', data)) & 0xFFFFFFFF
+
+
+class TrueTypeFont:
+    # Разбор TrueType в объёме, нужном для встраивания в PDF: символы,
+    # ширины, метрики и глифы.
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.data = file.read()
+        num_tables, = struct.unpack_from('>H', self.data, 4)
+        self.tables = {}
+        for index in range(num_tables):
+            tag, _, offset, length = struct.unpack_from(
+                '>4sIII', self.data, 12 + 16 * index
+            )
+            self.tables[tag] = (offset, length)
+        if b'glyf' not in self.tables:
+            raise ValueError(f'{path}: нужен шрифт TrueType (таблица glyf)')
+        self.name = SUBSET_TAG + '+' + (
+            re.sub(r'[^A-Za-z0-9-]', '', Path(path).stem) or 'Font'
+        )
+
+        head = self.table(b'head')
+        self.units_per_em, = struct.unpack_from('>H', head, 18)
+        self.bbox = struct.unpack_from('>4h', head, 36)
+        long_loca, = struct.unpack_from('>h', head, 50)
+        hhea = self.table(b'hhea')
+        self.ascent, self.descent = struct.unpack_from('>hh', hhea, 4)
+        metrics_count, = struct.unpack_from('>H', hhea, 34)
+        self.glyph_count, = struct.unpack_from('>H', self.table(b'maxp'), 4)
+
+        advances = [advance for advance, _ in struct.iter_unpack(
+            '>Hh', self.table(b'hmtx')[:4 * metrics_count]
+        )]
+        self.advances = advances + [advances[-1]] * (
+            self.glyph_count - metrics_count
+        )
+        loca = self.table(b'loca')
+        if long_loca:
+            self.loca = struct.unpack_from(f'>{self.glyph_count + 1}I', loca)
+        else:
+            self.loca = [offset * 2 for offset in struct.unpack_from(
+                f'>{self.glyph_count + 1}H', loca
+            )]
+        self.cmap = self._read_cmap()
+
+    def table(self, tag):
+        offset, length = self.tables[tag]
+        return self.data[offset:offset + length]
+
+    def _read_cmap(self):
+        cmap = self.table(b'cmap')
+        count, = struct.unpack_from('>H', cmap, 2)
+        subtables = {}
+        for index in range(count):
+            platform, encoding, offset = struct.unpack_from(
+                '>HHI', cmap, 4 + 8 * index
+            )
+            subtables[platform, encoding] = offset
+        for key in ((3, 10), (0, 4), (3, 1), (0, 3)):
+            if key not in subtables:
+                continue
+            offset = subtables[key]
+            table_format, = struct.unpack_from('>H', cmap, offset)
+            if table_format == 12:
+                return self._read_cmap_12(cmap, offset)
+            if table_format == 4:
+                return self._read_cmap_4(cmap, offset)
+        raise ValueError('В шрифте нет таблицы символов Unicode')
+
+    @staticmethod
+    def _read_cmap_4(cmap, offset):
+        seg_count = struct.unpack_from('>H', cmap, offset + 6)[0] // 2
+        ends = struct.unpack_from(f'>{seg_count}H', cmap, offset + 14)
+        starts_at = offset + 16 + 2 * seg_count
+        starts = struct.unpack_from(f'>{seg_count}H', cmap, starts_at)
+        deltas = struct.unpack_from(f'>{seg_count}h', cmap,
+                                    starts_at + 2 * seg_count)
+        ranges_at = starts_at + 4 * seg_count
+        range_offsets = struct.unpack_from(f'>{seg_count}H', cmap, ranges_at)
+        mapping = {}
+        for index, (start, end, delta, range_offset) in enumerate(
+                zip(starts, ends, deltas, range_offsets)):
+            for code in range(start, min(end, 0xFFFE) + 1):
+                if range_offset:
+                    glyph, = struct.unpack_from(
+                        '>H', cmap,
+                        ranges_at + 2 * index + range_offset
+                        + 2 * (code - start)
+                    )
+                    glyph = (glyph + delta) & 0xFFFF if glyph else 0
+                else:
+                    glyph = (code + delta) & 0xFFFF
+                if glyph:
+                    mapping[code] = glyph
+        return mapping
+
+    @staticmethod
+    def _read_cmap_12(cmap, offset):
+        groups, = struct.unpack_from('>I', cmap, offset + 12)
+        mapping = {}
+        for start, end, glyph in struct.iter_unpack(
+                '>III', cmap[offset + 16:offset + 16 + 12 * groups]):
+            for code in range(start, end + 1):
+                mapping[code] = glyph + code - start
+        return mapping
+
+    def glyphs(self, text):
+        return [self.cmap.get(ord(char), 0) for char in text]
+
+    def text_width(self, text, size):
+        return (sum(self.advances[glyph] for glyph in self.glyphs(text))
+                * size / self.units_per_em)
+
+    def scaled(self, value):
+        return round(value * 1000 / self.units_per_em)
+
+    def _components(self, glyph):
+        start, end = self.loca[glyph], self.loca[glyph + 1]
+        position = self.tables[b'glyf'][0] + start
+        if end == start or struct.unpack_from(
+                '>h', self.data, position)[0] >= 0:
+            return
+        position += 10
+        flags = MORE_COMPONENTS
+        while flags & MORE_COMPONENTS:
+            flags, component = struct.unpack_from('>HH', self.data, position)
+            yield component
+            position += 8 if flags & ARG_1_AND_2_ARE_WORDS else 6
+            if flags & WE_HAVE_A_SCALE:
+                position += 2
+            elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+                position += 4
+            elif flags & WE_HAVE_A_TWO_BY_TWO:
+                position += 8
+
+    def subset(self, glyphs):
+        # Неиспользованные глифы становятся пустыми, номера остальных не
+        # меняются: текст кодируется ими напрямую (Identity-H).
+        keep, pending = set(), [0, *glyphs]
+        while pending:
+            glyph = pending.pop()
+            if glyph not in keep:
+                keep.add(glyph)
+                pending.extend(self._components(glyph))
+        source = self.table(b'glyf')
+        glyf, loca = bytearray(), [0]
+        for glyph in range(self.glyph_count):
+            if glyph in keep:
+                glyf += source[self.loca[glyph]:self.loca[glyph + 1]]
+                glyf += b'\0' * (-len(glyf) % 4)
+            loca.append(len(glyf))
+        head = bytearray(self.table(b'head'))
+        struct.pack_into('>I', head, 8, 0)
+        struct.pack_into('>h', head, 50, 1)
+        tables = {tag: self.table(tag) for tag in SUBSET_TABLES
+                  if tag in self.tables}
+        tables.update({
+            b'glyf': bytes(glyf),
+            b'loca': struct.pack(f'>{len(loca)}I', *loca),
+            b'head': bytes(head),
+        })
+        return self._build_sfnt(tables)
+
+    @staticmethod
+    def _build_sfnt(tables):
+        count = len(tables)
+        power = 1 << (count.bit_length() - 1)
+        directory = bytearray(struct.pack(
+            '>IHHHH', 0x00010000, count, power * 16,
+            power.bit_length() - 1, (count - power) * 16
+        ))
+        body, head_at = bytearray(), None
+        offset = 12 + 16 * count
+        for tag in sorted(tables):
+            data = tables[tag]
+            if tag == b'head':
+                head_at = offset + len(body)
+            directory += struct.pack('>4sIII', tag, _checksum(data),
+                                     offset + len(body), len(data))
+            body += data + b'\0' * (-len(data) % 4)
+        font = directory + body
+        struct.pack_into('>I', font, head_at + 8,
+                         (0xB1B0AFBA - _checksum(bytes(font))) & 0xFFFFFFFF)
+        return bytes(font)
+
+
+@lru_cache(maxsize=None)
+def load_font(path):
+    return TrueTypeFont(path)
+
+
+def _wrap(font, text, size, width):
+    line = ''
+    for word in text.split(' '):
+        candidate = f'{line} {word}' if line else word
+        if not line or font.text_width(candidate, size) <= width:
+            line = candidate
+            continue
+        yield line
+        line = word
+    # Слово шире строки режется по символам.
+    while font.text_width(line, size) > width and len(line) > 1:
+        cut = len(line) - 1
+        while cut > 1 and font.text_width(line[:cut], size) > width:
+            cut -= 1
+        yield line[:cut]
+        line = line[cut:]
+    yield line
+
+
+class _PDFWriter:
+    # Считает смещения объектов по мере отдачи байтов: xref пишется в
+    # конце, без буферизации документа.
+
+    def __init__(self, font):
+        self.font = font
+        self.position = 0
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = FIRST_PAGE_ID
+        self.chars = {}
+
+    def _emit(self, data):
+        self.position += len(data)
+        return data
+
+    def _object(self, object_id, body):
+        self.offsets[object_id] = self.position
+        return self._emit(b'%d 0 obj\n%s\nendobj\n' % (object_id, body))
+
+    def _stream(self, object_id, data, extra=b''):
+        compressed = zlib.compress(data)
+        return self._object(object_id, b''.join((
+            b'<< /Length %d /Filter /FlateDecode%s >>\nstream\n'
+            % (len(compressed), extra),
+            compressed, b'\nendstream'
+        )))
+
+    def header(self):
+        return self._emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def page(self, lines):
+        content = []
+        for text, size, y in lines:
+            glyphs = self.font.glyphs(text)
+            self.chars.update(zip(glyphs, text))
+            content.append(b'BT /F1 %d Tf %d %.2f Td <%s> Tj ET\n' % (
+                size, PAGE_MARGIN, y,
+                b''.join(b'%04X' % glyph for glyph in glyphs)
+            ))
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self.page_ids.append(page_id)
+        return self._stream(content_id, b''.join(content)) + self._object(
+            page_id,
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>'
+            % (PAGES_ID, PAGE_WIDTH, PAGE_HEIGHT, FONT_ID, content_id)
+        )
+
+    def finish(self):
+        font = self.font
+        name = font.name.encode()
+        chunks = [
+            self._object(PAGES_ID, b'<< /Type /Pages /Kids [%s] /Count %d >>'
+                         % (b' '.join(b'%d 0 R' % page_id
+                                      for page_id in self.page_ids),
+                            len(self.page_ids))),
+            self._object(FONT_ID, (
+                b'<< /Type /Font /Subtype /Type0 /BaseFont /%s '
+                b'/Encoding /Identity-H /DescendantFonts [%d 0 R] '
+                b'/ToUnicode %d 0 R >>'
+            ) % (name, CID_FONT_ID, TO_UNICODE_ID)),
+            self._object(CID_FONT_ID, (
+                b'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /%s '
+                b'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) '
+                b'/Supplement 0 >> /FontDescriptor %d 0 R '
+                b'/CIDToGIDMap /Identity /DW %d /W [%s] >>'
+            ) % (name, DESCRIPTOR_ID, font.scaled(font.advances[0]),
+                 b' '.join(b'%d [%d]' % (glyph,
+                                         font.scaled(font.advances[glyph]))
+                           for glyph in sorted(self.chars)))),
+            self._object(DESCRIPTOR_ID, (
+                b'<< /Type /FontDescriptor /FontName /%s /Flags 32 '
+                b'/FontBBox [%d %d %d %d] /ItalicAngle 0 /Ascent %d '
+                b'/Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R >>'
+            ) % (name, *map(font.scaled, font.bbox), font.scaled(font.ascent),
+                 font.scaled(font.descent), font.scaled(font.ascent),
+                 FONT_FILE_ID)),
+        ]
+        subset = font.subset(self.chars)
+        chunks.append(self._stream(FONT_FILE_ID, subset,
+                                   b' /Length1 %d' % len(subset)))
+        chunks.append(self._stream(TO_UNICODE_ID, self._to_unicode()))
+        chunks.append(self._object(
+            CATALOG_ID, b'<< /Type /Catalog /Pages %d 0 R >>' % PAGES_ID
+        ))
+        xref_at = self.position
+        size = self.next_id
+        chunks.append(b'xref\n0 %d\n0000000000 65535 f \n' % size)
+        chunks.extend(b'%010d 00000 n \n' % self.offsets[object_id]
+                      for object_id in range(1, size))
+        chunks.append(b'trailer\n<< /Size %d /Root %d 0 R >>\n'
+                      b'startxref\n%d\n%%%%EOF\n' % (size, CATALOG_ID,
+                                                     xref_at))
+        return b''.join(chunks)
+
+    def _to_unicode(self):
+        entries = [b'<%04X> <%s>' % (glyph, char.encode('utf-16-be').hex()
+                                     .upper().encode())
+                   for glyph, char in sorted(self.chars.items())]
+        blocks = []
+        for start in range(0, len(entries), TO_UNICODE_BLOCK):
+            block = entries[start:start + TO_UNICODE_BLOCK]
+            blocks.append(b'%d beginbfchar\n%s\nendbfchar\n'
+                          % (len(block), b'\n'.join(block)))
+        return b''.join((
+            b'/CIDInit /ProcSet findresource begin\n12 dict begin\n'
+            b'begincmap\n/CIDSystemInfo << /Registry (Adobe) '
+            b'/Ordering (UCS) /Supplement 0 >> def\n'
+            b'/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n'
+            b'1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n',
+            *blocks,
+            b'endcmap\nCMapName currentdict /CMap defineresource pop\n'
+            b'end\nend\n'
+        ))
+
+
+def stream_pdf(paragraphs, font):
+    # paragraphs: (текст, кегль). Отдаёт документ по страницам, в памяти
+    # только текущая страница и набор использованных глифов.
+    writer = _PDFWriter(font)
+    yield writer.header()
+    width = PAGE_WIDTH - 2 * PAGE_MARGIN
+    lines, y = [], PAGE_HEIGHT - PAGE_MARGIN
+    for text, size in paragraphs:
+        leading = size * LINE_SPACING
+        for line in _wrap(font, text, size, width):
+            if lines and y - leading < PAGE_MARGIN:
+                yield writer.page(lines)
+                lines, y = [], PAGE_HEIGHT - PAGE_MARGIN
+            y -= leading
+            lines.append((line, size, y))
+    yield writer.page(lines)
+    yield writer.finish()
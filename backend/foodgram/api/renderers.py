@@ -0,0 +1,69 @@
+import math
+import re
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SCALAR_TYPES = frozenset((str, int, bool, type(None)))
+# Где вывод orjson может разойтись с json.dumps: null вместо NaN и
+# Infinity, показатель степени (1e16 и 1e+16, 0.000015 и 1.5e-05).
+SUSPECT_NUMBERS = re.compile(rb'null|[0-9]e|0\.0000|[0-9]{17}')
+
+
+def needs_json_encoder(data):
+    # Есть ли среди значений float или Decimal, которые json.dumps пишет
+    # иначе, чем orjson: NaN, бесконечности и экспоненциальная запись.
+    # Строки и целые числа не обходятся.
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            value = value.values()
+        elif not isinstance(value, (list, tuple)):
+            if isinstance(value, (float, Decimal)):
+                number = float(value)
+                if not math.isfinite(number) or 'e' in repr(number):
+                    return True
+            continue
+        stack.extend(item for item in value
+                     if type(item) not in SCALAR_TYPES)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Компактный JSON через orjson, если он установлен. Даты, Decimal,
+    # ленивые строки и прочее отдаются в JSONEncoder DRF, поэтому вывод
+    # совпадает с JSONRenderer; в остальных случаях работает он сам.
+    encoder_default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact or self.get_indent(
+                    accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_default,
+                option=(orjson.OPT_PASSTHROUGH_DATETIME
+                        | orjson.OPT_NON_STR_KEYS)
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        # orjson пишет NaN и Infinity как null (JSONRenderer со strict их
+        # отвергает, без strict пишет NaN) и по-своему записывает
+        # показатель степени: такие данные отдаём JSONRenderer.
+        if SUSPECT_NUMBERS.search(ret) and needs_json_encoder(data):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace(
+            '\u2029'.encode(), b'\\u2029'
+        )
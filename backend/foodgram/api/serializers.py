@@ -1,55 +1,165 @@
 import base64
+import binascii
+import os
+import tempfile
 
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
 from rest_framework import serializers
+from PIL import Image
 from rest_framework.exceptions import ValidationError
 
-from recipes.models import (Recipe, Ingredient, Tag, IngredientRecipe)
+from recipes.catalog import ingredient_catalog, tag_catalog
+from recipes.cook_index import bump_cook_index_version
+from recipes.image_processing import store_image
+from recipes.media import release_image
+from recipes.models import (Recipe, Ingredient, Tag, IngredientRecipe,
+                            ShoppingListItem)
+from recipes.signals import muted_composition_signals
+from recipes.versions import bump_catalog_version
 
 User = get_user_model()
 
 MAX_IMAGE_SIZE_BYTES = 100000
+MAX_IMAGE_PIXELS = 4096 * 4096
+IMAGE_SPOOL_SIZE = 64 * 1024
+BASE64_CHUNK_SIZE = 64 * 1024
+BASE64_MARKER = ';base64,'
+IMAGE_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
 MIN_AMOUNT = 1
 MAX_AMOUNT = 32000
 NAME_SIZE = 256
+MAX_BULK_RECIPES = 100
+RECIPE_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            try:
-                format, imgstr = data.split(';base64,')
-                ext = format.split('/')[-1]
-                if len(imgstr) > MAX_IMAGE_SIZE_BYTES:
-                    raise ValidationError('Изображение слишком большое')
-                return ContentFile(base64.b64decode(imgstr), name=f'temp.{ext}'
-                                   )
-            except Exception as e:
-                raise ValidationError(str(e))
+            return self._decode(data)
         return super().to_internal_value(data)
 
+    def _decode(self, data):
+        start = data.find(BASE64_MARKER)
+        if start == -1:
+            raise ValidationError('Ожидается изображение в формате base64')
+        start += len(BASE64_MARKER)
+        encoded_size = len(data) - start
+        padding = data.count('=', max(len(data) - 2, start))
+        if encoded_size * 3 // 4 - padding > MAX_IMAGE_SIZE_BYTES:
+            raise ValidationError('Изображение слишком большое')
+
+        file = tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_SIZE)
+        image_format = None
+        try:
+            for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    data[offset:offset + BASE64_CHUNK_SIZE], validate=True
+                ))
+                if image_format is None:
+                    image_format = self._check_header(file)
+            if image_format is None:
+                image_format = self._check_header(file, final=True)
+            file.seek(0)
+            Image.open(file).verify()
+        except (binascii.Error, ValueError):
+            file.close()
+            raise ValidationError('Некорректные данные base64')
+        except (OSError, SyntaxError):
+            file.close()
+            raise ValidationError('Файл не является изображением')
+        except ValidationError:
+            file.close()
+            raise
+        file.seek(0)
+        return File(file, name=f'temp.{IMAGE_FORMATS[image_format]}')
+
+    def _check_header(self, file, final=False):
+        # Pillow читает только заголовок, поэтому размеры известны
+        # до декодирования остальной части файла.
+        file.seek(0)
+        try:
+            image = Image.open(file)
+        except Image.DecompressionBombError:
+            raise ValidationError('Изображение слишком большое')
+        except (OSError, SyntaxError):
+            if final:
+                raise
+            return None
+        finally:
+            file.seek(0, os.SEEK_END)
+        if image.format not in IMAGE_FORMATS:
+            raise ValidationError('Неподдерживаемый формат изображения')
+        width, height = image.size
+        if width * height > MAX_IMAGE_PIXELS:
+            raise ValidationError('Изображение слишком большое')
+        return image.format
+
+
+def image_variant_urls(variants, request):
+    urls = {}
+    for label, name in variants.items():
+        if label == 'source':
+            continue
+        url = default_storage.url(name)
+        urls[label] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    def to_representation(self, value):
+        return image_variant_urls(value, self.context.get('request'))
+
 
 class MyUserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(required=False)
+    avatar_variants = ImageVariantsField()
 
     class Meta:
         model = User
         fields = (
             'email', 'id', 'username',
             'first_name', 'last_name',
-            'is_subscribed', 'avatar'
+            'is_subscribed', 'avatar', 'avatar_variants'
         )
 
+    def update(self, instance, validated_data):
+        avatar = validated_data.pop('avatar', None)
+        if avatar is not None:
+            store_image(instance, 'avatar', 'avatar_variants', avatar)
+        return super().update(instance, validated_data)
+
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'is_subscribed'):
+                return obj.is_subscribed
             return request.user.subscriptions.filter(author=obj).exists()
         return False
 
 
+class AvatarSerializer(serializers.ModelSerializer):
+    avatar = Base64ImageField(required=True)
+
+    class Meta:
+        model = User
+        fields = ('avatar',)
+
+    def update(self, instance, validated_data):
+        store_image(instance, 'avatar', 'avatar_variants',
+                    validated_data.pop('avatar'))
+        return super().update(instance, validated_data)
+
+
 class MyUserCreateSerializer(BaseUserCreateSerializer):
     class Meta(BaseUserCreateSerializer.Meta):
         model = User
@@ -61,39 +171,37 @@ class MyUserCreateSerializer(BaseUserCreateSerializer):
 
 
 class RecipeSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES
+    )
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(MyUserSerializer):
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
 
-    class Meta:
-        model = User
-        fields = ('id', 'username', 'email', 'first_name',
-                  'last_name', 'recipes', 'recipes_count')
-
-    def validate(self, data):
-        user = self.context['request'].user
-        author = self.instance
-        if user == author:
-            raise serializers.ValidationError(
-                'Нельзя подписаться на самого себя.'
-            )
-        if user.subscriptions.filter(author=author).exists():
-            raise serializers.ValidationError(
-                'Вы уже подписаны на этого пользователя.'
-            )
-        return data
+    class Meta(MyUserSerializer.Meta):
+        fields = MyUserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
     def get_recipes(self, obj):
         recipes = obj.recipes.all()
+        recipes_limit = self.context.get('recipes_limit')
+        if recipes_limit:
+            recipes = recipes[:recipes_limit]
         return RecipeSerializer(recipes, many=True, context=self.context).data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -108,59 +216,120 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
-class IngredientRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient')
-    name = serializers.ReadOnlyField(source='ingredient.name')
-    measurement_unit = serializers.ReadOnlyField(
-        source='ingredient.measurement_unit'
-    )
-    amount = serializers.IntegerField(
-        min_value=MIN_AMOUNT,
-        max_value=MAX_AMOUNT)
+def get_catalog_rows(field, catalog):
+    # Снимок справочника читается один раз на всю сериализацию: context
+    # общий у корневого сериализатора и всех вложенных полей.
+    context = field.context
+    key = f'{catalog.model._meta.model_name}_catalog_rows'
+    if key not in context:
+        context[key] = catalog.rows()
+    return context[key]
+
+
+class CatalogTagsField(serializers.ReadOnlyField):
+    # Теги рецепта берутся из снимка справочника, а не сериализуются
+    # заново для каждого рецепта. context['recipe_tags'] подменяет теги
+    # единственного рецепта уже известными объектами.
 
+    def get_attribute(self, instance):
+        tags = self.context.get('recipe_tags')
+        if tags is None:
+            return super().get_attribute(instance).all()
+        return tags
+
+    def to_representation(self, value):
+        rows = get_catalog_rows(self, tag_catalog)
+        return [dict(rows[tag.pk]) if tag.pk in rows
+                else TagSerializer(tag).data
+                for tag in value]
+
+
+class RecipeIngredientsSerializer(serializers.ListSerializer):
+    # context['recipe_ingredients'] подменяет строки состава единственного
+    # рецепта уже известными объектами.
+
+    def get_attribute(self, instance):
+        rows = self.context.get('recipe_ingredients')
+        if rows is None:
+            return super().get_attribute(instance)
+        return rows
+
+
+class IngredientRecipeSerializer(serializers.BaseSerializer):
     class Meta:
-        model = IngredientRecipe
-        fields = ('id', 'name', 'measurement_unit', 'amount')
+        list_serializer_class = RecipeIngredientsSerializer
+
+    def to_representation(self, instance):
+        ingredient = get_catalog_rows(self, ingredient_catalog).get(
+            instance.ingredient_id
+        )
+        if ingredient is None:
+            ingredient = IngredientSerializer(instance.ingredient).data
+        return {**ingredient, 'amount': instance.amount}
 
 
 class RecipeListSerializer(serializers.ModelSerializer):
-    tags = TagSerializer(many=True)
+    tags = CatalogTagsField()
     author = MyUserSerializer()
     ingredients = IngredientRecipeSerializer(
         many=True, source='infredients_recipe'
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    created_at = serializers.DateTimeField(format='%Y-%m-%d %H:%M:%S')
+    created_at = serializers.DateTimeField(format=RECIPE_DATETIME_FORMAT)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'description', 'cooking_time',
-                  'created_at')
+                  'name', 'image', 'image_variants', 'description',
+                  'cooking_time', 'created_at')
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'is_favorited'):
+                return obj.is_favorited
             return obj.favorites_r.filter(user=request.user).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'is_in_shopping_cart'):
+                return obj.is_in_shopping_cart
             return obj.shopping_cart.filter(user=request.user).exists()
         return False
 
 
+def get_objects_in_bulk(queryset, ids):
+    # Один запрос на весь список вместо SELECT на каждый id.
+    name = queryset.model._meta.verbose_name_plural
+    if len(set(ids)) != len(ids):
+        raise ValidationError(f'{name} не должны повторяться.')
+    found = queryset.in_bulk(ids)
+    missing = [str(pk) for pk in ids if pk not in found]
+    if missing:
+        raise ValidationError(
+            f'{name} с id {", ".join(missing)} не найдены.'
+        )
+    return [found[pk] for pk in ids]
+
+
+class IngredientAmountSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    amount = serializers.IntegerField(
+        min_value=MIN_AMOUNT,
+        max_value=MAX_AMOUNT)
+
+
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
-    ingredients = IngredientRecipeSerializer(
+    ingredients = IngredientAmountSerializer(
         many=True,
         source='infredients_recipe')
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True, required=True
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=True
     )
     image = Base64ImageField(required=True)
     text = serializers.CharField(source='description', required=True,
@@ -187,53 +356,122 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Необходимо указать хотя бы один ингредиент'
             )
-        return value
+        ingredients = get_objects_in_bulk(Ingredient.objects.all(),
+                                          [item['id'] for item in value])
+        return [{'ingredient': ingredient, 'amount': item['amount']}
+                for ingredient, item in zip(ingredients, value)]
 
     def validate_tags(self, value):
         if not value:
             raise serializers.ValidationError(
                 'Необходимо указать хотя бы один тег'
             )
-        return value
+        return get_objects_in_bulk(Tag.objects.all(), value)
 
     def create(self, validated_data):
         ingredients = validated_data.pop('infredients_recipe')
         tags = validated_data.pop('tags')
         validated_data.pop('author', None)
-        recipe = Recipe.objects.create(
-            author=self.context['request'].user,
-            **validated_data)
-        recipe.tags.set(tags)
-        self._create_recipe_ingredients(recipe, ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                author=self.context['request'].user,
+                **validated_data)
+            recipe.tags.set(tags)
+            rows = IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe,
+                                 ingredient=ingredient,
+                                 amount=amount)
+                for ingredient, amount in self._by_ingredient_id(
+                    ingredients).values()
+            )
+            self._ingredients_changed()
+        recipe.is_favorited = False
+        recipe.is_in_shopping_cart = False
+        self._remember_related(tags, rows)
         return recipe
 
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('infredients_recipe', None)
         tags = validated_data.pop('tags', None)
-
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        if tags is not None:
-            instance.tags.set(tags)
-
-        if ingredients is not None:
-            instance.infredients_recipe.all().delete()
-            self._create_recipe_ingredients(instance, ingredients)
+        image = validated_data.pop('image', None)
+        old_image = (instance.image.name, instance.image_variants)
+
+        with transaction.atomic():
+            if image is not None:
+                store_image(instance, 'image', 'image_variants', image)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+            if instance.image.name != old_image[0]:
+                transaction.on_commit(lambda: release_image(*old_image))
+            if tags is not None:
+                instance.tags.set(tags)
+            rows = None
+            if ingredients is not None:
+                rows = self._update_recipe_ingredients(instance, ingredients)
+        self._remember_related(tags, rows)
         return instance
 
-    def _create_recipe_ingredients(self, recipe, ingredients_data):
-        ingredient_objs = []
-        for ingredient_data in ingredients_data:
-            ingredient_objs.append(IngredientRecipe(
-                recipe=recipe,
-                ingredient=ingredient_data['ingredient'],
-                amount=ingredient_data['amount']))
-        IngredientRecipe.objects.bulk_create(ingredient_objs)
+    @staticmethod
+    def _by_ingredient_id(ingredients_data):
+        return {item['ingredient'].pk: (item['ingredient'], item['amount'])
+                for item in ingredients_data}
+
+    def _update_recipe_ingredients(self, recipe, ingredients_data):
+        # Правим только изменившиеся строки и переносим в списки покупок
+        # разницу количеств, а не весь рецепт.
+        wanted = self._by_ingredient_id(ingredients_data)
+        deltas = {pk: amount for pk, (_, amount) in wanted.items()}
+        rows, changed, removed = [], [], []
+        for row in IngredientRecipe.objects.filter(
+                recipe=recipe).select_related('ingredient'):
+            deltas[row.ingredient_id] = (deltas.get(row.ingredient_id, 0)
+                                         - row.amount)
+            if row.ingredient_id not in wanted:
+                removed.append(row.pk)
+                continue
+            _, amount = wanted.pop(row.ingredient_id)
+            if row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+            rows.append(row)
+        created = [IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                    amount=amount)
+                   for ingredient, amount in wanted.values()]
+        if not (changed or created or removed):
+            return rows
+        IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        rows += IngredientRecipe.objects.bulk_create(created)
+        if removed:
+            with muted_composition_signals():
+                IngredientRecipe.objects.filter(pk__in=removed).delete()
+        ShoppingListItem.apply_amounts(
+            deltas, recipe.shopping_cart.values_list('user_id', flat=True)
+        )
+        self._ingredients_changed()
+        return rows
+
+    @staticmethod
+    def _ingredients_changed():
+        transaction.on_commit(bump_catalog_version)
+        transaction.on_commit(bump_cook_index_version)
+
+    def _remember_related(self, tags, rows):
+        # Записанные теги и строки состава уже в памяти: to_representation
+        # передаёт их через context, а не перечитывает из базы.
+        self._related_context = {}
+        if tags is not None:
+            self._related_context['recipe_tags'] = sorted(
+                tags, key=lambda tag: tag.pk
+            )
+        if rows is not None:
+            self._related_context['recipe_ingredients'] = sorted(
+                rows, key=lambda row: (row.ingredient.name, row.ingredient_id)
+            )
 
     def to_representation(self, instance):
         return RecipeListSerializer(
             instance,
-            context=self.context
+            context={**self.context,
+                     **getattr(self, '_related_context', {})}
         ).data
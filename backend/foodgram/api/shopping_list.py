@@ -0,0 +1,63 @@
+import csv
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .pdf import load_font, stream_pdf
+
+UTF8_BOM = '\ufeff'
+CSV_HEADER = ('№', 'Ингредиент', 'Количество', 'Единица измерения')
+SHOPPING_LIST_TITLE = 'Список покупок:'
+PDF_TITLE_SIZE = 14
+PDF_FONT_SIZE = 11
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def format_item(index, item):
+    return (f"{index}. {item['ingredient__name']} - "
+            f"{item['total_amount']} "
+            f"{item['ingredient__measurement_unit']}")
+
+
+def render_txt(items):
+    yield f'{SHOPPING_LIST_TITLE}\n'
+    for index, item in enumerate(items, start=1):
+        yield f'{format_item(index, item)}\n'
+
+
+def render_csv(items):
+    writer = csv.writer(Echo())
+    yield UTF8_BOM + writer.writerow(CSV_HEADER)
+    for index, item in enumerate(items, start=1):
+        yield writer.writerow((index, item['ingredient__name'],
+                               item['total_amount'],
+                               item['ingredient__measurement_unit']))
+
+
+def render_pdf(items):
+    # Шрифт загружается до начала ответа: без него вернётся ошибка,
+    # а не оборванный файл.
+    try:
+        font = load_font(settings.SHOPPING_LIST_PDF_FONT)
+    except (OSError, ValueError) as error:
+        raise ImproperlyConfigured(
+            f'Шрифт для PDF недоступен: {error}'
+        ) from error
+
+    def paragraphs():
+        yield SHOPPING_LIST_TITLE, PDF_TITLE_SIZE
+        for index, item in enumerate(items, start=1):
+            yield format_item(index, item), PDF_FONT_SIZE
+
+    return stream_pdf(paragraphs(), font)
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'pdf': (render_pdf, 'application/pdf'),
+}
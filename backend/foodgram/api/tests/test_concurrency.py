@@ -0,0 +1,161 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem, Subscription)
+
+User = get_user_model()
+
+THREADS = 8
+IMAGE_NAME = 'recipes/images/test.png'
+
+
+@override_settings(FEED_FANOUT_WORKERS=0, IMAGE_PROCESSING_WORKERS=0)
+class ConcurrentCollectionsTest(TransactionTestCase):
+    # Параллельные одинаковые запросы должны давать одну запись, ни одного
+    # ответа 500 и точные счётчики. На SQLite запись сериализуется всей
+    # базой, поэтому гонку воспроизводит только PostgreSQL.
+
+    def setUp(self):
+        if connection.vendor == 'sqlite':
+            self.skipTest('SQLite не допускает параллельной записи.')
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass'
+        )
+        self.token = Token.objects.create(user=self.user).key
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author, name=f'Рецепт {i}',
+                description='Описание', image=IMAGE_NAME, cooking_time=5,
+                image_variants={'source': IMAGE_NAME}
+            )
+            for i in range(2)
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(2)
+        ]
+        for recipe in self.recipes:
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=10 * (i + 1))
+                for i, ingredient in enumerate(self.ingredients)
+            )
+
+    def hammer(self, requests):
+        # requests: [(method, url, data)], каждый запрос в своём потоке,
+        # все стартуют одновременно.
+        barrier = threading.Barrier(len(requests))
+
+        def send(request):
+            method, url, data = request
+            client = APIClient(raise_request_exception=False)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+            try:
+                barrier.wait()
+                return getattr(client, method)(url, data,
+                                               format='json').status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(len(requests)) as pool:
+            return list(pool.map(send, requests))
+
+    def assert_single_success(self, statuses, success):
+        self.assertNotIn(500, statuses)
+        self.assertEqual(statuses.count(success), 1, statuses)
+        self.assertEqual(statuses.count(400), len(statuses) - 1, statuses)
+
+    def shopping_list(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.user
+        ).values_list('ingredient_id', 'total_amount'))
+
+    def test_favorite(self):
+        recipe = self.recipes[0]
+        url = f'/api/recipes/{recipe.pk}/favorite/'
+
+        self.assert_single_success(
+            self.hammer([('post', url, None)] * THREADS), 201
+        )
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 1)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+
+        self.assert_single_success(
+            self.hammer([('delete', url, None)] * THREADS), 204
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+
+    def test_shopping_cart(self):
+        recipe = self.recipes[0]
+        url = f'/api/recipes/{recipe.pk}/shopping_cart/'
+
+        self.assert_single_success(
+            self.hammer([('post', url, None)] * THREADS), 201
+        )
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user).count(), 1
+        )
+        self.assertEqual(self.shopping_list(), {
+            self.ingredients[0].pk: 10, self.ingredients[1].pk: 20
+        })
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.shopping_cart_count, 1)
+
+        self.assert_single_success(
+            self.hammer([('delete', url, None)] * THREADS), 204
+        )
+        self.assertEqual(self.shopping_list(), {})
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.shopping_cart_count, 0)
+
+    def test_shopping_cart_single_and_bulk(self):
+        recipe_ids = [recipe.pk for recipe in self.recipes]
+        requests = [
+            ('post', f'/api/recipes/{recipe_ids[0]}/shopping_cart/', None),
+            ('post', '/api/recipes/shopping_cart/bulk/',
+             {'recipes': recipe_ids}),
+        ] * (THREADS // 2)
+
+        statuses = self.hammer(requests)
+
+        self.assertNotIn(500, statuses)
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user).count(), 2
+        )
+        self.assertEqual(self.shopping_list(), {
+            self.ingredients[0].pk: 20, self.ingredients[1].pk: 40
+        })
+        for recipe in self.recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.shopping_cart_count, 1)
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+
+        self.assert_single_success(
+            self.hammer([('post', url, None)] * THREADS), 201
+        )
+        self.assertEqual(
+            Subscription.objects.filter(user=self.user).count(), 1
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
+
+        self.assert_single_success(
+            self.hammer([('delete', url, None)] * THREADS), 204
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 0)
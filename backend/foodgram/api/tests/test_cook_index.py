@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.cook_index import (bump_cook_index_deletions,
+                                bump_cook_index_version,
+                                recipe_ingredient_index)
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+
+User = get_user_model()
+
+IMAGE_NAME = 'recipes/images/test.png'
+URL = '/api/recipes/what-can-i-cook/'
+
+
+@override_settings(FEED_FANOUT_WORKERS=0, IMAGE_PROCESSING_WORKERS=0)
+class CookIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        cls.flour, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко')
+        )
+        cls.recipes = []
+        for index in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {index}',
+                description='Описание', image=IMAGE_NAME, cooking_time=5,
+                image_variants={'source': IMAGE_NAME}
+            )
+            IngredientRecipe.objects.create(recipe=recipe,
+                                            ingredient=cls.flour, amount=1)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        # Индекс живёт в процессе и мог запомнить рецепты других тестов.
+        bump_cook_index_version()
+        bump_cook_index_deletions()
+        self.client = APIClient()
+
+    def cook(self, *ingredients, limit=10):
+        response = self.client.get(URL, {
+            'ingredients': ','.join(str(item.pk) for item in ingredients),
+            'limit': limit,
+        })
+        self.assertEqual(response.status_code, 200)
+        return [(item['id'], item['coverage']) for item in response.data]
+
+    def test_ranks_by_coverage(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientRecipe.objects.create(recipe=self.recipes[0],
+                                            ingredient=self.milk, amount=1)
+
+        self.assertEqual(self.cook(self.flour), [
+            (self.recipes[2].pk, 1.0), (self.recipes[1].pk, 1.0),
+            (self.recipes[0].pk, 0.5),
+        ])
+
+    def test_deleted_recipes_leave_index(self):
+        self.assertEqual(len(self.cook(self.flour)), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_authenticate(self.author)
+            for recipe in self.recipes[1:]:
+                response = self.client.delete(f'/api/recipes/{recipe.pk}/')
+                self.assertEqual(response.status_code, 204)
+            self.client.force_authenticate(None)
+
+        self.assertEqual(self.cook(self.flour, limit=1),
+                         [(self.recipes[0].pk, 1.0)])
+        _, recipe_ingredients = recipe_ingredient_index._snapshot
+        self.assertNotIn(self.recipes[1].pk, recipe_ingredients)
+        self.assertNotIn(self.recipes[2].pk, recipe_ingredients)
+
+    def test_composition_change_is_picked_up(self):
+        self.cook(self.flour)
+        recipe = self.recipes[1]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientRecipe.objects.filter(recipe=recipe).delete()
+            IngredientRecipe.objects.create(recipe=recipe,
+                                            ingredient=self.milk, amount=1)
+
+        self.assertEqual(self.cook(self.milk), [(recipe.pk, 1.0)])
+        self.assertNotIn(recipe.pk,
+                         [recipe_id for recipe_id, _ in self.cook(self.flour)])
@@ -0,0 +1,122 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem, Subscription, Tag)
+
+User = get_user_model()
+
+IMAGE_NAME = 'recipes/images/test.png'
+AVATAR_NAME = 'avatars/test.png'
+LIST_URLS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=3&page=2',
+    '/api/recipes/?cursor=',
+    '/api/recipes/?limit=3&cursor=',
+    '/api/recipes/?tags=tag1',
+    '/api/recipes/?tags=tag0&tags=tag2',
+    '/api/recipes/?ordering=popular',
+    '/api/recipes/?search=Рецепт',
+    '/api/recipes/?is_favorited=1',
+    '/api/recipes/?is_in_shopping_cart=1',
+    '/api/recipes/feed/',
+    '/api/recipes/feed/?limit=3&cursor=',
+)
+
+
+@override_settings(FEED_FANOUT_WORKERS=0, IMAGE_PROCESSING_WORKERS=0)
+class FastRecipeSerializerParityTest(TestCase):
+    # serialize_recipe_rows должен давать байт в байт тот же JSON, что
+    # и RecipeListSerializer, на всех эндпоинтах ленты.
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.author = User.objects.create_user(
+                username='author', email='author@example.com',
+                password='pass', first_name='Автор', last_name='Авторов',
+                avatar=AVATAR_NAME,
+                avatar_variants={'source': AVATAR_NAME,
+                                 'small': 'avatars/test_small.png'}
+            )
+            cls.user = User.objects.create_user(
+                username='user', email='user@example.com', password='pass'
+            )
+            tags = [Tag.objects.create(name=f'Тег {i}', slug=f'tag{i}')
+                    for i in range(3)]
+            ingredients = [
+                Ingredient.objects.create(name=name, measurement_unit='г')
+                for name in ('яблоко', 'абрикос', 'мука', 'молоко')
+            ]
+            cls.recipes = []
+            for i in range(8):
+                recipe = Recipe.objects.create(
+                    author=cls.author if i % 2 else cls.user,
+                    name=f'Рецепт {i}', description=f'Описание {i}',
+                    image=IMAGE_NAME, cooking_time=i + 1,
+                    image_variants={'source': IMAGE_NAME,
+                                    'small': 'recipes/images/test_small.png'}
+                )
+                recipe.tags.set(tags[i % 3:])
+                IngredientRecipe.objects.bulk_create(
+                    IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                     amount=i + j + 1)
+                    for j, ingredient in enumerate(ingredients[:i % 4 + 1])
+                )
+                cls.recipes.append(recipe)
+            Subscription.objects.create(user=cls.user, author=cls.author)
+            Favorite.objects.create(user=cls.user, recipe=cls.recipes[1])
+            ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[3])
+            ShoppingListItem.rebuild([cls.user.pk])
+
+    def setUp(self):
+        self.anon = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def render(self, client, url, fast):
+        # Кэш ленты сбрасывается, чтобы каждый ответ собирался заново
+        # выбранным способом.
+        cache.clear()
+        with self.settings(FAST_RECIPE_SERIALIZER=fast):
+            response = client.get(url)
+        return response.status_code, JSONRenderer().render(response.data)
+
+    def assert_same_output(self, client, url):
+        fast = self.render(client, url, fast=True)
+        self.assertEqual(fast, self.render(client, url, fast=False))
+        return fast
+
+    def test_anonymous(self):
+        urls = [url for url in LIST_URLS if '/feed/' not in url]
+        for url in (*urls, f'/api/recipes/{self.recipes[1].pk}/'):
+            with self.subTest(url=url):
+                status_code, _ = self.assert_same_output(self.anon, url)
+                self.assertEqual(status_code, 200)
+
+    def test_authenticated(self):
+        for url in (*LIST_URLS, f'/api/recipes/{self.recipes[1].pk}/',
+                    f'/api/recipes/{self.recipes[3].pk}/'):
+            with self.subTest(url=url):
+                status_code, _ = self.assert_same_output(self.client, url)
+                self.assertEqual(status_code, 200)
+
+    def test_next_cursor_page(self):
+        for client in (self.anon, self.client):
+            cache.clear()
+            next_url = client.get('/api/recipes/?limit=3&cursor=').data[
+                'next'
+            ]
+            with self.subTest(user=client is self.client):
+                self.assert_same_output(client, next_url)
+
+    def test_pages_are_not_empty(self):
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(len(response.data['results']), 4)
+        recipe = response.data['results'][0]
+        self.assertTrue(recipe['tags'])
+        self.assertTrue(recipe['ingredients'])
+        self.assertTrue(recipe['author']['is_subscribed'])
@@ -0,0 +1,91 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+
+User = get_user_model()
+
+IMAGE_NAME = 'recipes/images/old.png'
+AVATAR_NAME = 'avatars/old.png'
+
+
+def encode_image(color):
+    buffer = BytesIO()
+    Image.new('RGB', (20, 20), color).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@override_settings(IMAGE_PROCESSING_WORKERS=0)
+class ImageVariantsResetTest(TestCase):
+    # Миниатюры строятся после коммита; до тех пор в записи не должно
+    # оставаться миниатюр прежнего изображения.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass',
+            avatar=AVATAR_NAME,
+            avatar_variants={'source': AVATAR_NAME,
+                             'small': 'avatars/old_small.png'}
+        )
+        cls.tag = Tag.objects.create(name='Тег', slug='tag')
+        cls.ingredient = Ingredient.objects.create(name='мука',
+                                                   measurement_unit='г')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', description='Описание',
+            image=IMAGE_NAME, cooking_time=5,
+            image_variants={'source': IMAGE_NAME,
+                            'small': 'recipes/images/old_small.png'}
+        )
+        cls.recipe.tags.set([cls.tag])
+        IngredientRecipe.objects.create(recipe=cls.recipe,
+                                        ingredient=cls.ingredient, amount=1)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_recipe_image_change_resets_variants(self):
+        response = self.client.patch(f'/api/recipes/{self.recipe.pk}/', {
+            'image': encode_image('red'), 'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 1}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.image.name, IMAGE_NAME)
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def test_recipe_update_without_image_keeps_variants(self):
+        response = self.client.patch(f'/api/recipes/{self.recipe.pk}/', {
+            'name': 'Новое название', 'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 1}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, IMAGE_NAME)
+        self.assertEqual(self.recipe.image_variants['source'], IMAGE_NAME)
+
+    def test_avatar_change_resets_variants(self):
+        response = self.client.put('/api/users/me/avatar/', {
+            'avatar': encode_image('blue'),
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertNotEqual(self.user.avatar.name, AVATAR_NAME)
+        self.assertEqual(self.user.avatar_variants, {})
@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import FastJSONRenderer
+
+
+class NonStrictJSONRenderer(JSONRenderer):
+    strict = False
+
+
+class NonStrictFastJSONRenderer(FastJSONRenderer):
+    strict = False
+
+
+class FastJSONRendererTest(SimpleTestCase):
+    def test_matches_json_renderer(self):
+        data = {
+            'results': [{'id': 1, 'name': 'Рецепт\u2028', 'avatar': None,
+                         'created_at': timezone.now(),
+                         'amount': Decimal('1.5'),
+                         'label': gettext_lazy('Рецепт')}],
+            'next': None,
+            'ratio': 0.25,
+        }
+        self.assertEqual(FastJSONRenderer().render(data),
+                         JSONRenderer().render(data))
+
+    def test_rejects_non_finite_numbers(self):
+        for value in (float('nan'), float('inf'), Decimal('-Infinity')):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    FastJSONRenderer().render({'items': [{'value': value}]})
+
+    def test_non_strict_matches_json_renderer(self):
+        data = {'items': [float('nan'), None, float('-inf')]}
+        self.assertEqual(NonStrictFastJSONRenderer().render(data),
+                         NonStrictJSONRenderer().render(data))
+
+    def test_exponent_floats_match_json_renderer(self):
+        for value in (1e16, 1e-7, 1.5e-05, -2.5e300, Decimal('1E+20')):
+            with self.subTest(value=value):
+                data = {'items': [{'value': value, 'name': 'null 1e5'}]}
+                self.assertEqual(FastJSONRenderer().render(data),
+                                 JSONRenderer().render(data))
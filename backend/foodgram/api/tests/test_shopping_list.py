@@ -0,0 +1,66 @@
+import os
+import re
+import zlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, ShoppingListItem
+
+User = get_user_model()
+
+ITEMS = 120
+
+
+class ShoppingListPDFTest(TestCase):
+    # Без шрифта из SHOPPING_LIST_PDF_FONT проверять нечего: в образе он
+    # ставится пакетом fonts-dejavu-core.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass'
+        )
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                user=cls.user, total_amount=index,
+                ingredient=Ingredient.objects.create(
+                    name=f'Ингредиент {index:03}', measurement_unit='г'
+                )
+            )
+            for index in range(1, ITEMS + 1)
+        )
+
+    def setUp(self):
+        if not os.path.exists(settings.SHOPPING_LIST_PDF_FONT):
+            self.skipTest('Шрифт для PDF не установлен.')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_download_pdf(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?file_format=pdf'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.streaming)
+        data = b''.join(response.streaming_content)
+        self.assertTrue(data.startswith(b'%PDF-1.4'))
+        self.assertTrue(data.endswith(b'%%EOF\n'))
+        # Каждый объект стоит ровно по смещению, записанному в xref.
+        xref_at = int(re.search(rb'startxref\n(\d+)', data).group(1))
+        offsets = re.findall(rb'(\d{10}) 00000 n ', data[xref_at:])
+        for object_id, offset in enumerate(offsets, start=1):
+            self.assertTrue(
+                data[int(offset):].startswith(b'%d 0 obj' % object_id)
+            )
+        pages = int(re.search(rb'/Type /Pages /Kids \[[^\]]*\] /Count (\d+)',
+                              data).group(1))
+        self.assertGreater(pages, 1)
+        first_page = zlib.decompress(re.search(
+            rb'stream\n(.*?)\nendstream', data, re.DOTALL
+        ).group(1))
+        self.assertIn(b'/F1 14 Tf', first_page)
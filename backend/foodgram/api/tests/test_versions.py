@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient
+from recipes.versions import (CATALOG_VERSION_KEY, VERSIONS_CACHE_ALIAS,
+                              bump_version, get_version)
+
+PAGE_CACHE_MAX_ENTRIES = 10
+
+
+class VersionCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('молоко', 'мука', 'мёд')
+        )
+
+    @override_settings(CACHES={
+        **settings.CACHES,
+        'default': {**settings.CACHES['default'], 'OPTIONS': {
+            'MAX_ENTRIES': PAGE_CACHE_MAX_ENTRIES, 'CULL_FREQUENCY': 1,
+        }},
+    })
+    def test_page_cache_culling_keeps_versions(self):
+        bump_version(CATALOG_VERSION_KEY)
+        version = caches[VERSIONS_CACHE_ALIAS].get(CATALOG_VERSION_KEY)
+
+        for index in range(PAGE_CACHE_MAX_ENTRIES * 3):
+            cache.set(f'page:{index}', index)
+
+        self.assertIsNotNone(version)
+        self.assertEqual(
+            caches[VERSIONS_CACHE_ALIAS].get(CATALOG_VERSION_KEY), version
+        )
+
+    def test_ingredient_lookup_skips_cache_after_warm_up(self):
+        client = APIClient()
+        url = '/api/ingredients/?name=м'
+        expected = client.get(url).data
+
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get(url).data, expected)
+
+    def test_bump_is_visible_in_process_at_once(self):
+        version = get_version(CATALOG_VERSION_KEY)
+
+        bump_version(CATALOG_VERSION_KEY)
+
+        self.assertNotEqual(get_version(CATALOG_VERSION_KEY), version)
@@ -1,33 +1,63 @@
-from hashlib import md5
-
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ValidationError
-from django.core.files.storage import default_storage
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Subquery, Value)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
-from rest_framework import filters, viewsets, status
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import (IsAuthenticated, AllowAny,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
+from recipes.catalog import ingredient_catalog, tag_catalog
+from recipes.cook_index import recipe_ingredient_index
+from recipes.counters import adjust_counters
+from recipes.ingredient_index import ingredient_index
+from recipes.media import release_image
 from recipes.models import (Recipe, Ingredient, Tag, Favorite,
-                            ShoppingCart, IngredientRecipe)
-from .serializers import (TagSerializer,
+                            ShoppingCart, ShoppingListItem, ShortLink,
+                            Subscription)
+from recipes.timelines import timeline_filter
+from recipes.versions import get_catalog_version
+from .etags import etag_matches, make_etag, not_modified, set_etag
+from .fast_serializers import RECIPE_ROW_FIELDS, serialize_recipe_rows
+from .feed_cache import get_feed_cache_key
+from .filters import RecipeSearchFilter
+from .pagination import RecipeCursorPagination
+from .serializers import (AvatarSerializer, RecipeIdsSerializer,
+                          TagSerializer,
                           RecipeCreateUpdateSerializer,
                           RecipeListSerializer,
                           IngredientSerializer,
                           SubscriptionSerializer)
+from .shopping_list import SHOPPING_LIST_FORMATS
 
 
 User = get_user_model()
 
+SHOPPING_LIST_CHUNK_SIZE = 500
+POPULAR_ORDERING = 'popular'
+COOK_DEFAULT_LIMIT = 10
+COOK_MAX_LIMIT = 50
+
 
 class UserViewSet(DjoserUserViewSet):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_subscribed=Exists(Subscription.objects.filter(
+                    user=user, author=OuterRef('pk')))
+            )
+        return queryset
+
     @action(
         methods=['put', 'delete'],
         detail=False,
@@ -43,24 +73,21 @@ class UserViewSet(DjoserUserViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            try:
-                user.avatar = request.data['avatar']
-                user.save()
-                return Response(
-                    {'avatar': user.avatar.url},
-                    status=status.HTTP_200_OK
-                )
-            except ValidationError as e:
-                return Response(
-                    {'error': str(e)},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            old_avatar = (user.avatar.name, user.avatar_variants)
+            serializer = AvatarSerializer(user, data=request.data,
+                                          context={'request': request})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            if user.avatar.name != old_avatar[0]:
+                transaction.on_commit(lambda: release_image(*old_avatar))
+            return Response(serializer.data, status=status.HTTP_200_OK)
 
         elif request.method == 'DELETE':
-            if default_storage.exists(user.avatar.name):
-                default_storage.delete(user.avatar.name)
+            old_avatar = (user.avatar.name, user.avatar_variants)
             user.avatar = None
+            user.avatar_variants = {}
             user.save()
+            transaction.on_commit(lambda: release_image(*old_avatar))
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -70,16 +97,32 @@ class UserViewSet(DjoserUserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
+        recipes_limit = self._get_recipes_limit(request)
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time',
+            'author_id'
+        )
+        if recipes_limit:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(author_id=OuterRef('author_id'))
+                .order_by('-created_at')
+                .values('pk')[:recipes_limit]
+            ))
         subscribed_users = User.objects.filter(
-            subscribers__user=user).prefetch_related('recipes')
-
+            subscribers__user=user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes)
+        ).order_by('username')
+
+        page = self.paginate_queryset(subscribed_users)
         serializer = SubscriptionSerializer(
-            subscribed_users,
+            page,
             many=True,
-            context={'request': request}
+            context={'request': request, 'recipes_limit': recipes_limit}
         )
-
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         methods=['post', 'delete'],
@@ -90,44 +133,102 @@ class UserViewSet(DjoserUserViewSet):
         user = request.user
         author = get_object_or_404(User, id=id)
         if request.method == 'POST':
-            serializer = SubscriptionSerializer(author,
-                                                data=request.data,
-                                                context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            user.subscriptions.create(author=author)
+            if user == author:
+                return Response(
+                    {'errors': 'Нельзя подписаться на самого себя.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                with transaction.atomic():
+                    user.subscriptions.create(author=author)
+            except IntegrityError:
+                return Response(
+                    {'errors': 'Вы уже подписаны на этого пользователя.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            serializer = SubscriptionSerializer(
+                author,
+                context={'request': request,
+                         'recipes_limit': self._get_recipes_limit(request)}
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         elif request.method == 'DELETE':
-            subscription = user.subscriptions.get(author=author)
-            if not subscription:
+            with transaction.atomic():
+                deleted, _ = user.subscriptions.filter(
+                    author=author).delete()
+            if not deleted:
                 return Response(
                     {'error': 'Вы не подписаны на этого пользователя.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            subscription.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def _get_recipes_limit(request):
+        try:
+            recipes_limit = int(request.query_params.get('recipes_limit'))
+        except (TypeError, ValueError):
+            return None
+        return recipes_limit if recipes_limit > 0 else None
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class CatalogRetrieveMixin:
+    # Справочники отдаются из снимка в памяти процесса (recipes.catalog).
+    catalog = None
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            row = self.catalog.get(int(kwargs[self.lookup_field]))
+        except ValueError:
+            row = None
+        if row is None:
+            raise NotFound()
+        return Response(row)
+
+
+class TagViewSet(CatalogRetrieveMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     lookup_field = 'id'
     pagination_class = None
+    catalog = tag_catalog
 
+    def list(self, request, *args, **kwargs):
+        return Response(tag_catalog.all())
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+
+class IngredientViewSet(CatalogRetrieveMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('name',)
     pagination_class = None
+    catalog = ingredient_catalog
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return Response(ingredient_index.all())
+        return Response(ingredient_index.search(name))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all().order_by('-created_at')
+    queryset = Recipe.objects.defer('search_vector').order_by(
+        '-created_at', '-id'
+    )
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = ['tags__slug', 'author']
-    search_fields = ['name']
+    filter_backends = [DjangoFilterBackend, RecipeSearchFilter]
+    filterset_fields = ['author']
+
+    @property
+    def paginator(self):
+        if (not hasattr(self, '_paginator')
+                and self.action in ('list', 'feed')
+                and RecipeCursorPagination.cursor_query_param
+                in self.request.query_params
+                and self.request.query_params.get('ordering')
+                != POPULAR_ORDERING):
+            self._paginator = RecipeCursorPagination()
+        return super().paginator
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -135,34 +236,133 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return RecipeListSerializer
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'get_short_link']:
+        if self.action in ['list', 'retrieve', 'get_short_link',
+                           'what_can_i_cook']:
             return [AllowAny()]
         return [IsAuthenticated()]
 
     def get_queryset(self):
         queryset = super().get_queryset()
         user = self.request.user
+        authors = User.objects.all()
+
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+            )
+            authors = authors.annotate(
+                is_subscribed=Exists(Subscription.objects.filter(
+                    user=user, author=OuterRef('pk')))
+            )
 
-        is_favorited = self.request.query_params.get('is_favorited')
-        if is_favorited == '1' and user.is_authenticated:
-            queryset = queryset.filter(favorites_r__user=user)
-
-        is_in_shopping_cart = self.request.query_params.get(
-            'is_in_shopping_cart')
-        if is_in_shopping_cart == '1' and user.is_authenticated:
-            queryset = queryset.filter(shopping_cart__user=user)
+            if self.request.query_params.get('is_favorited') == '1':
+                queryset = queryset.filter(is_favorited=True)
+            if self.request.query_params.get('is_in_shopping_cart') == '1':
+                queryset = queryset.filter(is_in_shopping_cart=True)
 
         tags = self.request.query_params.getlist('tags')
         if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
+            queryset = queryset.filter(Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe_id=OuterRef('pk'),
+                    tag_id__in=Tag.objects.filter(
+                        slug__in=tags).values('pk')
+                )
+            ))
 
-        return queryset.select_related('author').prefetch_related(
-            'tags', 'infredients_recipe__ingredient'
+        if self.request.query_params.get('ordering') == POPULAR_ORDERING:
+            queryset = queryset.order_by('-favorites_count', '-created_at',
+                                         '-id')
+
+        return queryset.prefetch_related(
+            Prefetch('author', queryset=authors),
+            'tags', 'infredients_recipe'
         )
 
+    def list(self, request, *args, **kwargs):
+        catalog_version = get_catalog_version()
+        cache_key = None
+        if not request.user.is_authenticated:
+            cache_key = get_feed_cache_key(request, catalog_version)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                etag, data = cached
+                if etag_matches(request, etag):
+                    return not_modified(etag)
+                return set_etag(Response(data), etag)
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.paginate_queryset(self._get_recipe_rows(queryset))
+        if rows is None:
+            return super().list(request, *args, **kwargs)
+        envelope = self.get_paginated_response(None).data
+        etag = make_etag(catalog_version, envelope, rows,
+                         sorted(request.query_params.lists()))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response = self.get_paginated_response(
+            self._serialize_rows(rows, queryset)
+        )
+        if cache_key is not None:
+            cache.set(cache_key, (etag, response.data),
+                      settings.FEED_CACHE_TIMEOUT)
+        return set_etag(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            queryset = self.get_queryset().filter(pk=kwargs['pk'])
+            rows = list(self._get_recipe_rows(queryset))
+        except ValueError:
+            rows = None
+        if not rows:
+            return super().retrieve(request, *args, **kwargs)
+        etag = make_etag(get_catalog_version(), rows)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return set_etag(
+            Response(self._serialize_rows(rows, queryset)[0]), etag
+        )
+
+    def _get_recipe_rows(self, queryset):
+        # Строки служат и для ETag, и для быстрой сериализации.
+        fields = [*RECIPE_ROW_FIELDS, 'updated_at']
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                author_is_subscribed=Exists(Subscription.objects.filter(
+                    user=user, author=OuterRef('author')))
+            )
+            fields += ['is_favorited', 'is_in_shopping_cart',
+                       'author_is_subscribed']
+        return queryset.prefetch_related(None).values_list(*fields,
+                                                           named=True)
+
+    def _serialize_rows(self, rows, queryset):
+        if settings.FAST_RECIPE_SERIALIZER:
+            return serialize_recipe_rows(rows, self.request)
+        recipes = queryset.in_bulk([row.pk for row in rows])
+        return self.get_serializer(
+            [recipes[row.pk] for row in rows if row.pk in recipes],
+            many=True
+        ).data
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def update(self, request, *args, **kwargs):
+        # В отличие от UpdateModelMixin не сбрасываем кэш prefetch:
+        # изменённые теги и ингредиенты сериализатор передаёт через
+        # context, а нетронутые берутся из prefetch.
+        serializer = self.get_serializer(
+            self.get_object(), data=request.data,
+            partial=kwargs.pop('partial', False)
+        )
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         if instance.author != request.user:
@@ -182,12 +382,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = request.user
         recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'POST':
-            if user.favorites.filter(recipe=recipe).exists():
+            try:
+                with transaction.atomic():
+                    self._lock_collections(user)
+                    Favorite.objects.create(user=user, recipe=recipe)
+            except IntegrityError:
                 return Response(
                     {'errors': 'Рецепт уже в избранном.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            Favorite.objects.create(user=request.user, recipe=recipe)
             return Response(
                 {'id': recipe.id, 'name': recipe.name,
                  'image': recipe.image.url,
@@ -195,7 +398,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_201_CREATED
             )
         elif request.method == 'DELETE':
-            favorite, _ = user.favorites.filter(recipe=recipe).delete()
+            with transaction.atomic():
+                self._lock_collections(user)
+                favorite, _ = user.favorites.filter(recipe=recipe).delete()
             if favorite == 0:
                 return Response(
                     {'errors': 'Рецепта нет в избранном.'},
@@ -212,12 +417,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = request.user
         recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'POST':
-            if user.shopping_cart_user.filter(recipe=recipe).exists():
+            try:
+                with transaction.atomic():
+                    self._lock_collections(user)
+                    ShoppingCart.objects.create(user=user, recipe=recipe)
+                    ShoppingListItem.apply_recipe(recipe.pk, [user.pk])
+            except IntegrityError:
                 return Response(
                     {'errors': 'Рецепт уже в списке покупок.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            ShoppingCart.objects.create(user=request.user, recipe=recipe)
             return Response(
                 {'id': recipe.id, 'name': recipe.name,
                  'image': recipe.image.url,
@@ -225,7 +434,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_201_CREATED
             )
         elif request.method == 'DELETE':
-            cart, _ = user.shopping_cart_user.filter(recipe=recipe).delete()
+            with transaction.atomic():
+                self._lock_collections(user)
+                cart, _ = user.shopping_cart_user.filter(
+                    recipe=recipe).delete()
+                if cart:
+                    ShoppingListItem.apply_recipe(recipe.pk, [user.pk],
+                                                  sign=-1)
             if cart == 0:
                 return Response(
                     {'errors': 'Рецепта нет в списке покупок.'},
@@ -233,31 +448,102 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 )
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='favorite/bulk'
+    )
+    def favorite_bulk(self, request):
+        return self._bulk_update_collection(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart/bulk'
+    )
+    def shopping_cart_bulk(self, request):
+        return self._bulk_update_collection(request, ShoppingCart)
+
+    @staticmethod
+    def _lock_collections(user):
+        # Избранное и корзина пользователя меняются под блокировкой его
+        # строки: пакет видит точный набор своих записей, и параллельный
+        # одиночный запрос не применит те же рецепты к списку покупок
+        # второй раз.
+        list(User.objects.select_for_update().filter(
+            pk=user.pk).values_list('pk'))
+
+    def _bulk_update_collection(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        user = request.user
+        found = set(Recipe.objects.filter(pk__in=recipe_ids).values_list(
+            'pk', flat=True
+        ))
+        entries = model.objects.filter(user=user, recipe_id__in=found)
+        adding = request.method == 'POST'
+        with transaction.atomic():
+            self._lock_collections(user)
+            present = set(entries.values_list('recipe_id', flat=True))
+            if adding:
+                changed = [pk for pk in recipe_ids
+                           if pk in found and pk not in present]
+                objs = model.objects.bulk_create(
+                    [model(user=user, recipe_id=pk) for pk in changed],
+                    ignore_conflicts=True
+                )
+                # bulk_create не отправляет post_save.
+                adjust_counters(model, objs, 1)
+            else:
+                changed = [pk for pk in recipe_ids if pk in present]
+                entries.filter(recipe_id__in=changed).delete()
+            if model is ShoppingCart and changed:
+                ShoppingListItem.apply_recipes(changed, [user.pk],
+                                               sign=1 if adding else -1)
+        changed = set(changed)
+        if adding:
+            done, skipped = 'added', 'exists'
+        else:
+            done, skipped = 'removed', 'missing'
+        return Response({'results': [
+            {'id': pk,
+             'status': ('not_found' if pk not in found
+                        else done if pk in changed else skipped)}
+            for pk in recipe_ids
+        ]})
+
     @action(
         detail=False,
         methods=['get'],
         permission_classes=[IsAuthenticated]
     )
     def download_shopping_cart(self, request):
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'errors': 'Поддерживаемые форматы: '
+                           f'{", ".join(SHOPPING_LIST_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        render, content_type = SHOPPING_LIST_FORMATS[file_format]
         ingredients_data = (
-            IngredientRecipe.objects
-            .filter(recipe__shopping_cart__user=request.user)
+            request.user.shopping_list_items
             .values(
                 'ingredient__name',
-                'ingredient__measurement_unit'
+                'ingredient__measurement_unit',
+                'total_amount'
             )
-            .annotate(total_amount=Sum('amount'))
             .order_by('ingredient__name')
+            .iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+        )
+        response = StreamingHttpResponse(render(ingredients_data),
+                                         content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment;filename="shopping_list.{file_format}"'
         )
-        file_content = ['Список покупок:\n']
-        for index, item in enumerate(ingredients_data, start=1):
-            file_content.append(f"{index}. {item['ingredient__name']} - "
-                                f"{item['total_amount']} "
-                                f"{item['ingredient__measurement_unit']}\n")
-        response = HttpResponse(''.join(file_content),
-                                content_type='text/plain; charset=utf-8')
-        response['Content-Disposition'] = ('attachment;'
-                                           'filename="shopping_list.txt"')
         return response
 
     @action(
@@ -268,16 +554,67 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_name='get_short_link'
     )
     def get_short_link(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        short_link = self._generate_short_link(recipe)
+        recipe = get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        short_link = ShortLink.get_or_create_for_recipe(recipe)
         return Response(
-            {'short-link': short_link},
+            {'short-link': (f'{settings.FOODGRAM_BASE_URL}'
+                            f'/r/{short_link.hash}')},
             status=status.HTTP_200_OK
         )
 
-    def _generate_short_link(self, recipe):
-        hash_str = md5(str(recipe.id).encode()).hexdigest()[:6]
-        return f'{settings.FOODGRAM_BASE_URL}/r/{hash_str}'
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        queryset = self.get_queryset().filter(timeline_filter(request.user))
+        rows = self.paginate_queryset(self._get_recipe_rows(queryset))
+        return self.get_paginated_response(
+            self._serialize_rows(rows, queryset)
+        )
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[AllowAny],
+        url_path='what-can-i-cook'
+    )
+    def what_can_i_cook(self, request):
+        try:
+            ingredient_ids = [
+                int(value)
+                for param in request.query_params.getlist('ingredients')
+                for value in param.split(',') if value
+            ]
+            limit = int(request.query_params.get('limit',
+                                                 COOK_DEFAULT_LIMIT))
+        except ValueError:
+            return Response(
+                {'errors': 'Параметры ingredients и limit должны быть '
+                           'целыми числами.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ingredient_ids:
+            return Response(
+                {'errors': 'Укажите хотя бы один ингредиент.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = min(max(limit, 1), COOK_MAX_LIMIT)
+        # Берём кандидатов с запасом: до сброса версии после коммита
+        # индекс может ещё помнить только что удалённые рецепты.
+        ranked = recipe_ingredient_index.rank(ingredient_ids, limit * 2)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in ranked]
+        )
+        ranked = [(recipes[recipe_id], coverage)
+                  for recipe_id, coverage in ranked
+                  if recipe_id in recipes][:limit]
+        data = self.get_serializer([recipe for recipe, _ in ranked],
+                                   many=True).data
+        for item, (_, coverage) in zip(data, ranked):
+            item['coverage'] = round(coverage, 2)
+        return Response(data)
 
 
 class ShortLinkRedirectView(viewsets.GenericViewSet):
@@ -285,10 +622,11 @@ class ShortLinkRedirectView(viewsets.GenericViewSet):
     lookup_field = 'hash_str'
 
     def retrieve(self, request, hash_str=None):
-        recipes = Recipe.objects.all()
-        for recipe in recipes:
-            if md5(str(recipe.id).encode()).hexdigest()[:6] == hash_str:
-                return redirect('recipe-detail', pk=recipe.pk)
+        recipe_id = ShortLink.objects.filter(hash=hash_str).values_list(
+            'recipe_id', flat=True
+        ).first()
+        if recipe_id is not None:
+            return redirect(f'/recipes/{recipe_id}/')
         return Response(
             {'error': 'Рецепт не найден'},
             status=status.HTTP_404_NOT_FOUND
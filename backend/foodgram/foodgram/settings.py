@@ -53,7 +53,12 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ],
 
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.LimitPageNumberPagination',
     'PAGE_SIZE': 6,
 }
 
@@ -116,6 +121,44 @@ DATABASES = {
 #     }
 # }
 
+# Кэш должен быть общим для всех воркеров и management-команд: через него
+# расходятся версии каталогов и индексов. Таблицы для DatabaseCache
+# создаются командой createcachetable.
+DATABASE_CACHE = 'django.core.cache.backends.db.DatabaseCache'
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', DATABASE_CACHE)
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', 'django_cache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+    },
+    # Версии каталогов и индексов живут отдельно от страниц ленты:
+    # вытеснение страниц не должно сбрасывать версии.
+    'versions': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'VERSIONS_CACHE_LOCATION',
+            'django_cache_versions' if CACHE_BACKEND == DATABASE_CACHE
+            else CACHE_LOCATION
+        ),
+        'TIMEOUT': None,
+        'KEY_PREFIX': 'versions',
+    },
+}
+if CACHE_BACKEND == DATABASE_CACHE:
+    # DatabaseCache при переполнении удаляет записи в порядке ключей.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 20000)),
+    }
+
+FEED_CACHE_TIMEOUT = int(os.getenv('FEED_CACHE_TIMEOUT', 300))
+
+# Лента и карточка рецепта собираются из строк values_list
+# (api.fast_serializers); False — через RecipeListSerializer.
+FAST_RECIPE_SERIALIZER = os.getenv(
+    'FAST_RECIPE_SERIALIZER', 'True'
+).lower() == 'true'
+
 AUTH_USER_MODEL = 'users.User'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -148,5 +191,33 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+DEFAULT_FILE_STORAGE = 'foodgram.storage.ContentAddressedStorage'
+MEDIA_GC_GRACE_SECONDS = 600
+
+# 0 — обрабатывать изображения сразу после коммита, без фонового пула.
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+RECIPE_IMAGE_SIZES = {
+    'small': (320, 320),
+    'medium': (640, 640),
+}
+AVATAR_IMAGE_SIZES = {
+    'small': (64, 64),
+    'medium': (200, 200),
+}
+
+# Ленты подписок: авторы, у которых подписчиков больше
+# FEED_FANOUT_MAX_SUBSCRIBERS, подмешиваются в ленту при чтении.
+FEED_FANOUT_WORKERS = int(os.getenv('FEED_FANOUT_WORKERS', 1))
+FEED_FANOUT_BATCH_SIZE = 500
+FEED_FANOUT_MAX_SUBSCRIBERS = int(
+    os.getenv('FEED_FANOUT_MAX_SUBSCRIBERS', 1000)
+)
+FEED_MAX_LENGTH = 500
+
+# TrueType-шрифт с кириллицей для списка покупок в PDF.
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -6,7 +6,7 @@ from .models import (Ingredient, Tag, Recipe, Favorite,
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author',)
+    list_display = ('name', 'author', 'favorites_count',)
     search_fields = ('name', 'author',)
     list_filter = ('tags',)
     filter_horizontal = ('tags',)
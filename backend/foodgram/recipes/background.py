@@ -0,0 +1,50 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTasks:
+    # Работа после коммита в общем на процесс пуле потоков. Размер пула
+    # задаёт настройка workers_setting; 0 — выполнять прямо в on_commit.
+
+    def __init__(self, workers_setting, thread_name_prefix, error_message):
+        self.workers_setting = workers_setting
+        self.thread_name_prefix = thread_name_prefix
+        self.error_message = error_message
+        self._executor = None
+
+    @property
+    def workers(self):
+        return getattr(settings, self.workers_setting)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix=self.thread_name_prefix
+            )
+        return self._executor
+
+    def run_on_commit(self, func, *args):
+        in_pool = bool(self.workers)
+
+        def run():
+            try:
+                func(*args)
+            except Exception:
+                logger.exception('%s: %s%r', self.error_message,
+                                 func.__name__, args)
+            finally:
+                # Потоки пула не проходят через цикл запроса: соединение
+                # с базой закрываем сами.
+                if in_pool:
+                    connection.close()
+
+        if in_pool:
+            transaction.on_commit(lambda: self._get_executor().submit(run))
+        else:
+            transaction.on_commit(run)
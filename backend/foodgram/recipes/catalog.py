@@ -0,0 +1,62 @@
+import threading
+from types import MappingProxyType
+
+from .models import Ingredient, Tag
+from .versions import (INGREDIENT_INDEX_VERSION_KEY, TAG_CATALOG_VERSION_KEY,
+                       bump_version, get_version)
+
+
+def bump_tag_catalog_version():
+    bump_version(TAG_CATALOG_VERSION_KEY)
+
+
+class Catalog:
+    # Неизменяемый снимок справочника id -> словарь в памяти процесса.
+    # Версия хранится в общем кэше, поэтому сигнал в одном воркере
+    # сбрасывает снимки во всех.
+
+    def __init__(self, model, fields, version_key):
+        self.model = model
+        self.fields = fields
+        self.version_key = version_key
+        self._lock = threading.Lock()
+        self._snapshot = (None, MappingProxyType({}))
+
+    def _get_snapshot(self):
+        version = get_version(self.version_key)
+        snapshot = self._snapshot
+        if snapshot[0] == version:
+            return snapshot
+        with self._lock:
+            if self._snapshot[0] != version:
+                rows = self.model.objects.values(*self.fields)
+                self._snapshot = (version, MappingProxyType({
+                    row['id']: MappingProxyType(row) for row in rows
+                }))
+            return self._snapshot
+
+    @property
+    def version(self):
+        return self._get_snapshot()[0]
+
+    def rows(self):
+        # Неизменяемое отображение id -> строка. Для пакетов: версия
+        # проверяется один раз, а не на каждый id.
+        return self._get_snapshot()[1]
+
+    def get(self, pk):
+        row = self.rows().get(pk)
+        return None if row is None else dict(row)
+
+    def get_many(self, pks):
+        rows = self.rows()
+        return {pk: None if rows.get(pk) is None else dict(rows[pk])
+                for pk in pks}
+
+    def all(self):
+        return [dict(row) for row in self._get_snapshot()[1].values()]
+
+
+tag_catalog = Catalog(Tag, ('id', 'name', 'slug'), TAG_CATALOG_VERSION_KEY)
+ingredient_catalog = Catalog(Ingredient, ('id', 'name', 'measurement_unit'),
+                             INGREDIENT_INDEX_VERSION_KEY)
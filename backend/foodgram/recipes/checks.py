@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .versions import VERSIONS_CACHE_ALIAS
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+SHARED_CACHES = ('default', VERSIONS_CACHE_ALIAS)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    # Версии каталогов, индексов и кэш ленты сбрасываются через кэш:
+    # процессный кэш не видит сбросов из других воркеров и команд.
+    if settings.DEBUG:
+        return []
+    return [
+        Warning(
+            f'Кэш {alias} ({config["BACKEND"]}) не общий для процессов: '
+            'воркеры будут отдавать устаревшие каталоги и ленты.',
+            hint='Укажите CACHE_BACKEND с общим хранилищем '
+                 '(DatabaseCache, Memcached, Redis).',
+            id='recipes.W001',
+        )
+        for alias, config in settings.CACHES.items()
+        if alias in SHARED_CACHES
+        and config['BACKEND'] in PROCESS_LOCAL_CACHES
+    ]
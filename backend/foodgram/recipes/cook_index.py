@@ -0,0 +1,139 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import IngredientRecipe, Recipe
+from .versions import (COOK_INDEX_DELETIONS_KEY, COOK_INDEX_VERSION_KEY,
+                       bump_version, get_version)
+
+COOK_INDEX_FULL_REBUILD_SECONDS = 3600
+COOK_INDEX_SYNC_SLACK = timedelta(minutes=5)
+
+
+def bump_cook_index_version():
+    bump_version(COOK_INDEX_VERSION_KEY)
+
+
+def bump_cook_index_deletions():
+    bump_version(COOK_INDEX_DELETIONS_KEY)
+
+
+class RecipeIngredientIndex:
+    # Инвертированный индекс ингредиент -> отсортированный массив id
+    # рецептов. При смене версии догружаются только рецепты с новым
+    # updated_at, после удалений выбрасываются исчезнувшие рецепты, раз
+    # в час индекс строится заново. Снимок не меняется на месте: rank()
+    # читает его без блокировки, синхронизация собирает новый и
+    # подменяет целиком.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = 0
+        self._synced_at = None
+        # (ингредиент -> array id рецептов, рецепт -> frozenset ингредиентов)
+        self._snapshot = ({}, {})
+
+    def _rebuild(self):
+        postings = defaultdict(list)
+        recipe_ingredients = defaultdict(set)
+        rows = IngredientRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).order_by('recipe_id')
+        for recipe_id, ingredient_id in rows.iterator():
+            if ingredient_id not in recipe_ingredients[recipe_id]:
+                recipe_ingredients[recipe_id].add(ingredient_id)
+                postings[ingredient_id].append(recipe_id)
+        self._built_at = time.monotonic()
+        return (
+            {ingredient_id: array('q', recipe_ids)
+             for ingredient_id, recipe_ids in postings.items()},
+            {recipe_id: frozenset(ingredient_ids)
+             for recipe_id, ingredient_ids in recipe_ingredients.items()},
+        )
+
+    def _sync_changed(self, since, prune):
+        postings, recipe_ingredients = self._snapshot
+        postings, recipe_ingredients = dict(postings), dict(recipe_ingredients)
+        copied = set()
+
+        def posting(ingredient_id):
+            # Массивы копируются при первой правке: старый снимок могут
+            # в это время читать другие потоки.
+            if ingredient_id not in copied:
+                copied.add(ingredient_id)
+                postings[ingredient_id] = array(
+                    'q', postings.get(ingredient_id, ())
+                )
+            return postings[ingredient_id]
+
+        def remove(recipe_id):
+            for ingredient_id in recipe_ingredients.pop(recipe_id, ()):
+                recipe_ids = posting(ingredient_id)
+                del recipe_ids[bisect_left(recipe_ids, recipe_id)]
+
+        if prune:
+            for recipe_id in recipe_ingredients.keys() - set(
+                    Recipe.objects.values_list('pk', flat=True).iterator()):
+                remove(recipe_id)
+        changed = list(Recipe.objects.filter(
+            updated_at__gte=since
+        ).values_list('pk', flat=True))
+        rows = defaultdict(set)
+        for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+            recipe_id__in=changed
+        ).values_list('recipe_id', 'ingredient_id'):
+            rows[recipe_id].add(ingredient_id)
+        for recipe_id in changed:
+            remove(recipe_id)
+            if recipe_id not in rows:
+                continue
+            recipe_ingredients[recipe_id] = frozenset(rows[recipe_id])
+            for ingredient_id in rows[recipe_id]:
+                insort(posting(ingredient_id), recipe_id)
+        return postings, recipe_ingredients
+
+    def _sync(self):
+        version = (get_version(COOK_INDEX_VERSION_KEY),
+                   get_version(COOK_INDEX_DELETIONS_KEY))
+        expired = (time.monotonic() - self._built_at
+                   > COOK_INDEX_FULL_REBUILD_SECONDS)
+        if version == self._version and not expired:
+            return
+        with self._lock:
+            if version == self._version and not expired:
+                return
+            started = timezone.now()
+            if self._synced_at is None or expired:
+                self._snapshot = self._rebuild()
+            else:
+                self._snapshot = self._sync_changed(
+                    self._synced_at - COOK_INDEX_SYNC_SLACK,
+                    prune=version[1] != self._version[1]
+                )
+            self._synced_at = started
+            self._version = version
+
+    def rank(self, ingredient_ids, limit):
+        # Возвращает [(recipe_id, покрытие)], лучшие рецепты первыми.
+        self._sync()
+        postings, recipe_ingredients = self._snapshot
+        hits = Counter()
+        for ingredient_id in set(ingredient_ids):
+            hits.update(postings.get(ingredient_id, ()))
+        return heapq.nlargest(
+            limit,
+            ((recipe_id, count / len(recipe_ingredients[recipe_id]))
+             for recipe_id, count in hits.items()
+             if recipe_id in recipe_ingredients),
+            key=lambda item: (item[1], item[0])
+        )
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Favorite, Recipe, ShoppingCart, Subscription
+
+User = get_user_model()
+
+# (модель со счётчиком, поле счётчика, считаемая модель, внешний ключ)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+)
+
+
+def adjust_counters(source, instances, delta):
+    for model, field, counted, fk in COUNTERS:
+        if counted is source:
+            pks = {getattr(instance, f'{fk}_id') for instance in instances}
+            model.objects.filter(pk__in=pks).update(
+                **{field: Greatest(F(field) + delta, 0)}
+            )
+
+
+def reconcile_counters():
+    fixed = {}
+    for model, field, counted, fk in COUNTERS:
+        actual = Coalesce(Subquery(
+            counted.objects.filter(**{fk: OuterRef('pk')}).order_by()
+            .values(fk).annotate(total=Count('pk')).values('total')
+        ), 0)
+        fixed[f'{model._meta.label}.{field}'] = model.objects.exclude(
+            **{field: actual}
+        ).update(**{field: actual})
+    return fixed
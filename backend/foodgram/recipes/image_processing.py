@@ -0,0 +1,72 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from .background import BackgroundTasks
+from .versions import bump_catalog_version
+
+WEBP_SUFFIX = '_webp'
+SAVE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png'}
+
+image_tasks = BackgroundTasks('IMAGE_PROCESSING_WORKERS', 'image-variants',
+                              'Не удалось обработать изображение')
+
+
+def _render(image, size, image_format):
+    variant = image.copy()
+    variant.thumbnail(size)
+    if image_format == 'JPEG' and variant.mode not in ('RGB', 'L'):
+        variant = variant.convert('RGB')
+    buffer = BytesIO()
+    variant.save(buffer, image_format)
+    return ContentFile(buffer.getvalue())
+
+
+def make_image_variants(name, sizes):
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    image_format = image.format if image.format in SAVE_FORMATS else 'PNG'
+    root = os.path.splitext(name)[0]
+    variants = {'source': name}
+    for label, size in sizes.items():
+        variants[label] = default_storage.save(
+            f'{root}_{label}.{SAVE_FORMATS[image_format]}',
+            _render(image, size, image_format)
+        )
+        variants[label + WEBP_SUFFIX] = default_storage.save(
+            f'{root}_{label}.webp', _render(image, size, 'WEBP')
+        )
+    return variants
+
+
+def process_image_variants(model, pk, field_name, variants_field, name,
+                           sizes):
+    variants = make_image_variants(name, sizes)
+    updated = model.objects.filter(
+        pk=pk, **{field_name: name}
+    ).update(**{variants_field: variants})
+    if updated:
+        bump_catalog_version()
+
+
+def store_image(instance, field_name, variants_field, content):
+    # Файл пишется в хранилище до save(): новое имя известно заранее, и
+    # миниатюры прежнего изображения сбрасываются тем же UPDATE.
+    field_file = getattr(instance, field_name)
+    old_name = field_file.name
+    field_file.save(content.name, content, save=False)
+    if field_file.name != old_name:
+        setattr(instance, variants_field, {})
+
+
+def schedule_image_variants(instance, field_name, variants_field, sizes):
+    name = getattr(instance, field_name).name
+    if not name or getattr(instance, variants_field).get('source') == name:
+        return
+    image_tasks.run_on_commit(process_image_variants, type(instance),
+                              instance.pk, field_name, variants_field, name,
+                              sizes)
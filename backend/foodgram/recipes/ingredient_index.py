@@ -0,0 +1,64 @@
+import threading
+from bisect import bisect_left
+
+from .catalog import ingredient_catalog
+from .versions import INGREDIENT_INDEX_VERSION_KEY, bump_version, get_version
+
+INGREDIENT_SEARCH_LIMIT = 20
+
+
+def bump_ingredient_index_version():
+    bump_version(INGREDIENT_INDEX_VERSION_KEY)
+
+
+def get_ingredient_index_version():
+    return get_version(INGREDIENT_INDEX_VERSION_KEY)
+
+
+class IngredientIndex:
+    # Снимок ингредиентов в памяти процесса, отсортированный по названию.
+    # Перестраивается только при смене версии в кэше.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = (None, (), ())
+
+    def _build(self):
+        rows = sorted(ingredient_catalog.all(),
+                      key=lambda row: (row['name'].lower(), row['id']))
+        return tuple(row['name'].lower() for row in rows), tuple(rows)
+
+    def _get_snapshot(self):
+        version = get_ingredient_index_version()
+        snapshot = self._snapshot
+        if snapshot[0] == version:
+            return snapshot
+        with self._lock:
+            if self._snapshot[0] != version:
+                self._snapshot = (version, *self._build())
+            return self._snapshot
+
+    def all(self):
+        return [dict(row) for row in self._get_snapshot()[2]]
+
+    def search(self, query, limit=INGREDIENT_SEARCH_LIMIT):
+        _, keys, rows = self._get_snapshot()
+        query = query.strip().lower()
+        if not query:
+            return [dict(row) for row in rows[:limit]]
+        result = []
+        index = bisect_left(keys, query)
+        while (index < len(keys) and len(result) < limit
+               and keys[index].startswith(query)):
+            result.append(rows[index])
+            index += 1
+        if len(result) < limit:
+            for key, row in zip(keys, rows):
+                if query in key and not key.startswith(query):
+                    result.append(row)
+                    if len(result) == limit:
+                        break
+        return [dict(row) for row in result]
+
+
+ingredient_index = IngredientIndex()
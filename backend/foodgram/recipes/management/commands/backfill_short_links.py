@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe, ShortLink
+
+
+class Command(BaseCommand):
+    help = 'Создаёт короткие ссылки для рецептов, у которых их ещё нет.'
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.filter(
+            short_link__isnull=True
+        ).only('pk').order_by('pk')
+        created = 0
+        for recipe in recipes.iterator():
+            ShortLink.get_or_create_for_recipe(recipe)
+            created += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано коротких ссылок: {created}'
+        ))
@@ -0,0 +1,23 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.media import release_files
+
+MEDIA_DIRECTORIES = ('recipes/images', 'avatars')
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы медиа, на которые не ссылается ни одна запись.'
+
+    def handle(self, *args, **options):
+        checked = deleted = 0
+        for directory in MEDIA_DIRECTORIES:
+            if not default_storage.exists(directory):
+                continue
+            _, files = default_storage.listdir(directory)
+            names = [f'{directory}/{name}' for name in files]
+            deleted += release_files(names)
+            checked += len(names)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено файлов: {checked}, удалено: {deleted}'
+        ))
@@ -0,0 +1,12 @@
+from recipes.ingredient_index import bump_ingredient_index_version
+from recipes.management.loaders import BaseLoadCommand
+from recipes.models import Ingredient
+
+
+class Command(BaseLoadCommand):
+    help = 'Загружает ингредиенты из CSV или JSON файла.'
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+
+    def after_load(self):
+        bump_ingredient_index_version()
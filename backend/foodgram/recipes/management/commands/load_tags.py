@@ -0,0 +1,12 @@
+from recipes.catalog import bump_tag_catalog_version
+from recipes.management.loaders import BaseLoadCommand
+from recipes.models import Tag
+
+
+class Command(BaseLoadCommand):
+    help = 'Загружает теги из CSV или JSON файла.'
+    model = Tag
+    fields = ('name', 'slug')
+
+    def after_load(self):
+        bump_tag_catalog_version()
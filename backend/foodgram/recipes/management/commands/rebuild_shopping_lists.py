@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённые списки покупок по корзинам.'
+
+    def handle(self, *args, **options):
+        ShoppingListItem.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Позиций в списках покупок: {ShoppingListItem.objects.count()}'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import TimelineEntry
+from recipes.timelines import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = 'Заново заполняет ленты подписок по текущим подпискам.'
+
+    def handle(self, *args, **options):
+        rebuild_timelines()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'
+        ))
@@ -0,0 +1,126 @@
+import csv
+import json
+import time
+from functools import partial
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+JSON_WHITESPACE = ' \t\r\n'
+
+
+def iter_csv_rows(file, fields):
+    for line_number, values in enumerate(csv.reader(file), start=1):
+        if not values:
+            continue
+        if len(values) < len(fields):
+            raise CommandError(
+                f'Строка {line_number}: ожидается полей {len(fields)}'
+            )
+        yield dict(zip(fields, values))
+
+
+def iter_json_rows(file, fields):
+    # Читает JSON-массив объектов по частям, не загружая файл целиком.
+    # expected: '[' в начале, 'value' после '[' или запятой, ',' после
+    # объекта; ']' допустима после '[' и после объекта.
+    decoder = json.JSONDecoder()
+    buffer, position, expected, first = '', 0, '[', True
+    for chunk in iter(partial(file.read, READ_CHUNK_SIZE), ''):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while (position < len(buffer)
+                   and buffer[position] in JSON_WHITESPACE):
+                position += 1
+            if position == len(buffer):
+                break
+            char = buffer[position]
+            if expected == '[':
+                if char != '[':
+                    raise CommandError('Ожидается JSON-массив объектов')
+                expected, position = 'value', position + 1
+                continue
+            if char == ']' and (expected == ',' or first):
+                return
+            if expected == ',':
+                if char != ',':
+                    raise CommandError(
+                        'Ожидается запятая между объектами JSON-массива'
+                    )
+                expected, position = 'value', position + 1
+                continue
+            if char in ',]':
+                raise CommandError('Ожидается объект JSON-массива')
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            expected, first = ',', False
+            try:
+                yield {field: row[field] for field in fields}
+            except (KeyError, TypeError):
+                raise CommandError(
+                    f'Объект {row!r} должен содержать поля {fields}'
+                )
+    raise CommandError('Неожиданный конец JSON-файла')
+
+
+READERS = {
+    'csv': iter_csv_rows,
+    'json': iter_json_rows,
+}
+
+
+class BaseLoadCommand(BaseCommand):
+    model = None
+    fields = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к CSV или JSON файлу')
+        parser.add_argument(
+            '--format', choices=READERS, dest='file_format',
+            help='Формат файла, по умолчанию определяется по расширению'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, path, file_format, batch_size, **options):
+        file_format = file_format or Path(path).suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        started = time.monotonic()
+        count_before = self.model.objects.count()
+        seen = set()
+        batch = []
+        total = 0
+        with open(path, encoding='utf-8', newline='') as file:
+            for row in READERS[file_format](file, self.fields):
+                total += 1
+                row = {field: str(value).strip()
+                       for field, value in row.items()}
+                key = tuple(row[field] for field in self.fields)
+                if key in seen or not all(key):
+                    continue
+                seen.add(key)
+                batch.append(self.model(**row))
+                if len(batch) >= batch_size:
+                    self._save(batch)
+                    batch = []
+        if batch:
+            self._save(batch)
+        self.after_load()
+        elapsed = time.monotonic() - started
+        created = self.model.objects.count() - count_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {total} за {elapsed:.2f} с '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с), '
+            f'добавлено записей: {created}'
+        ))
+
+    def _save(self, batch):
+        self.model.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def after_load(self):
+        pass
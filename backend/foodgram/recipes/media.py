@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db.models import Q
+
+from .image_processing import WEBP_SUFFIX
+from .models import Recipe
+
+User = get_user_model()
+
+
+def _variant_labels(sizes):
+    for label in sizes:
+        yield label
+        yield label + WEBP_SUFFIX
+
+
+def is_referenced(name):
+    recipes = Q(image=name)
+    for label in _variant_labels(settings.RECIPE_IMAGE_SIZES):
+        recipes |= Q(**{f'image_variants__{label}': name})
+    users = Q(avatar=name)
+    for label in _variant_labels(settings.AVATAR_IMAGE_SIZES):
+        users |= Q(**{f'avatar_variants__{label}': name})
+    return (Recipe.objects.filter(recipes).exists()
+            or User.objects.filter(users).exists())
+
+
+def is_recently_written(name):
+    # Совпадающая загрузка могла только что переиспользовать этот файл
+    # и ещё не закоммитить ссылку на него.
+    modified = default_storage.get_modified_time(name).timestamp()
+    return time.time() - modified < settings.MEDIA_GC_GRACE_SECONDS
+
+
+def release_files(names):
+    deleted = 0
+    for name in set(filter(None, names)):
+        if (default_storage.exists(name) and not is_referenced(name)
+                and not is_recently_written(name)):
+            default_storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+def release_image(name, variants):
+    return release_files([name, *variants.values()])
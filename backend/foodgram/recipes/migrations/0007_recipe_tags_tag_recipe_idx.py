@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX IF EXISTS recipe_tags_tag_recipe_idx;',
+        ),
+    ]
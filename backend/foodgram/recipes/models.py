@@ -1,7 +1,15 @@
-from django.db import models
+import secrets
+import string
+from hashlib import md5
+
+from django.contrib.postgres.search import SearchVectorField
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Sum, Value, When
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from users.models import PreservedFieldsMixin
+
 User = get_user_model()
 
 MAX_LENGHT_NAME_INGREDIENT = 128
@@ -9,6 +17,10 @@ MAX_LENGHT_MEASUREMENT_UNIT = 64
 MAX_LENGHT_TAG = 32
 MAX_LENGHT_RECIPE = 256
 MAX_LENGHT_SHORTLINK = 10
+MIN_LENGHT_SHORTLINK = 6
+SHORTLINK_ALPHABET = string.ascii_letters + string.digits
+SHORTLINK_RANDOM_ATTEMPTS = 10
+SHOPPING_LIST_BATCH_SIZE = 1000
 MAX_LENGHT = 32000
 MIN_LENGHT = 1
 
@@ -23,6 +35,12 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name} {self.measurement_unit}'
@@ -43,7 +61,7 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(PreservedFieldsMixin, models.Model):
     author = models.ForeignKey(User, related_name='recipes',
                                on_delete=models.CASCADE,
                                verbose_name='Автор')
@@ -53,6 +71,12 @@ class Recipe(models.Model):
         upload_to='recipes/images/',
         verbose_name='Картинка'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки'
+    )
     description = models.TextField(verbose_name='Описание рецепта')
     ingredients = models.ManyToManyField(Ingredient,
                                          through='IngredientRecipe',
@@ -72,11 +96,37 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата создания'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    # На PostgreSQL поддерживается recipes.search.update_search_vector
+    # и покрыт GIN-индексом (см. миграцию).
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах'
+    )
+
+    preserved_fields = ('favorites_count', 'shopping_cart_count',
+                        'search_vector')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'],
+                         name='recipe_created_at_id_idx'),
+            models.Index(fields=['-favorites_count', '-created_at', '-id'],
+                         name='recipe_popularity_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -179,6 +229,129 @@ class IngredientRecipe(models.Model):
                 f'{self.amount} {self.ingredient.measurement_unit}')
 
 
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Пользователь')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='timeline_entries',
+                               verbose_name='Рецепт')
+    created_at = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at'],
+                         name='timeline_user_created_at_idx'),
+        ]
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='shopping_list_items',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   related_name='shopping_list_items',
+                                   verbose_name='Ингредиент')
+    total_amount = models.IntegerField(verbose_name='Общее количество')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+        ordering = ['ingredient__name']
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient} x {self.total_amount}'
+
+    @classmethod
+    def apply_recipe(cls, recipe_id, user_ids, sign=1):
+        cls.apply_recipes([recipe_id], user_ids, sign)
+
+    @classmethod
+    def apply_recipes(cls, recipe_ids, user_ids, sign=1):
+        # Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов
+        # из списков покупок указанных пользователей.
+        amounts = (
+            IngredientRecipe.objects.filter(recipe_id__in=recipe_ids)
+            .values('ingredient_id')
+            .annotate(total=Sum('amount'))
+            .order_by()
+            .values_list('ingredient_id', 'total')
+        )
+        cls.apply_amounts(
+            {ingredient_id: sign * amount
+             for ingredient_id, amount in amounts},
+            user_ids
+        )
+
+    @classmethod
+    def apply_amounts(cls, amounts, user_ids):
+        # amounts: id ингредиента -> изменение количества.
+        user_ids = list(user_ids)
+        amounts = {ingredient_id: amount
+                   for ingredient_id, amount in amounts.items() if amount}
+        if not amounts or not user_ids:
+            return
+        items = cls.objects.filter(user_id__in=user_ids,
+                                   ingredient_id__in=amounts)
+        delta = Case(
+            *(When(ingredient_id=ingredient_id, then=Value(amount))
+              for ingredient_id, amount in amounts.items()),
+            output_field=models.IntegerField()
+        )
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(user_id=user_id, ingredient_id=ingredient_id,
+                     total_amount=0)
+                 for user_id in user_ids
+                 for ingredient_id, amount in amounts.items() if amount > 0],
+                ignore_conflicts=True
+            )
+            items.update(total_amount=F('total_amount') + delta)
+            if min(amounts.values()) < 0:
+                items.filter(total_amount__lte=0).delete()
+
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        items = cls.objects.all()
+        carts = IngredientRecipe.objects.filter(
+            recipe__shopping_cart__isnull=False
+        )
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+            carts = carts.filter(recipe__shopping_cart__user_id__in=user_ids)
+        totals = (
+            carts.values('recipe__shopping_cart__user_id', 'ingredient_id')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+        with transaction.atomic():
+            items.delete()
+            cls.objects.bulk_create(
+                (cls(user_id=row['recipe__shopping_cart__user_id'],
+                     ingredient_id=row['ingredient_id'],
+                     total_amount=row['total'])
+                 for row in totals.iterator()),
+                batch_size=SHOPPING_LIST_BATCH_SIZE
+            )
+
+
 class TagRecipe(models.Model):
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE,
                             related_name='recipe_tag',
@@ -203,3 +376,34 @@ class ShortLink(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.hash} -> {self.recipe}'
+
+    @staticmethod
+    def candidate_hashes(recipe_id):
+        # Сначала md5-префиксы: их раньше выдавал get-link, и уже
+        # разошедшиеся ссылки должны продолжать работать.
+        digest = md5(str(recipe_id).encode()).hexdigest()
+        for length in range(MIN_LENGHT_SHORTLINK, MAX_LENGHT_SHORTLINK + 1):
+            yield digest[:length]
+        for _ in range(SHORTLINK_RANDOM_ATTEMPTS):
+            yield ''.join(secrets.choice(SHORTLINK_ALPHABET)
+                          for _ in range(MAX_LENGHT_SHORTLINK))
+
+    @classmethod
+    def get_or_create_for_recipe(cls, recipe):
+        short_link = cls.objects.filter(recipe=recipe).first()
+        if short_link is not None:
+            return short_link
+        for hash_str in cls.candidate_hashes(recipe.pk):
+            try:
+                with transaction.atomic():
+                    return cls.objects.create(recipe=recipe, hash=hash_str)
+            except IntegrityError:
+                short_link = cls.objects.filter(recipe=recipe).first()
+                if short_link is not None:
+                    return short_link
+        raise IntegrityError(
+            f'Не удалось подобрать короткую ссылку для рецепта {recipe.pk}'
+        )
@@ -0,0 +1,56 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import (Case, Exists, F, OuterRef, Subquery, Value,
+                              When)
+from django.db.models.functions import Coalesce
+
+from .models import IngredientRecipe, Recipe
+
+SEARCH_CONFIG = 'russian'
+
+
+def uses_full_text_search():
+    return connection.vendor == 'postgresql'
+
+
+def update_search_vector(recipe_ids):
+    if not uses_full_text_search():
+        return
+    ingredient_names = Subquery(
+        IngredientRecipe.objects.filter(recipe=OuterRef('pk'))
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    Recipe.objects.filter(pk__in=recipe_ids).update(search_vector=(
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Coalesce(ingredient_names, Value('')),
+                       weight='C', config=SEARCH_CONFIG)
+    ))
+
+
+def search_recipes(queryset, text):
+    if uses_full_text_search():
+        query = SearchQuery(text, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', *queryset.query.order_by)
+
+    # Переносимый вариант для SQLite: вхождение подстроки с весами полей.
+    in_ingredients = Exists(IngredientRecipe.objects.filter(
+        recipe=OuterRef('pk'), ingredient__name__icontains=text
+    ))
+    return queryset.annotate(
+        search_rank=(
+            Case(When(name__icontains=text, then=Value(3)), default=0)
+            + Case(When(description__icontains=text, then=Value(2)),
+                   default=0)
+            + Case(When(in_ingredients, then=Value(1)), default=0)
+        )
+    ).filter(search_rank__gt=0).order_by(
+        '-search_rank', *queryset.query.order_by
+    )
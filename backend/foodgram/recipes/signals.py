@@ -0,0 +1,270 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .catalog import bump_tag_catalog_version
+from .cook_index import bump_cook_index_deletions, bump_cook_index_version
+from .counters import adjust_counters
+from .image_processing import schedule_image_variants
+from .ingredient_index import bump_ingredient_index_version
+from .media import release_image
+from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                     ShoppingCart, ShoppingListItem, Subscription, Tag)
+from .search import update_search_vector, uses_full_text_search
+from .timelines import (remove_author_from_timeline, schedule_backfill,
+                        schedule_fan_out)
+from .versions import bump_catalog_version
+
+User = get_user_model()
+
+SEARCH_FIELDS = {'name', 'description'}
+
+_state = threading.local()
+
+
+@contextmanager
+def muted_composition_signals():
+    # Для кода, который сам переносит правку состава в списки покупок
+    # одним apply_amounts: построчные сигналы IngredientRecipe её не
+    # дублируют.
+    _state.muted = getattr(_state, 'muted', 0) + 1
+    try:
+        yield
+    finally:
+        _state.muted -= 1
+
+
+def _tracks_composition(instance):
+    return not (getattr(_state, 'muted', 0)
+                or instance.recipe_id in getattr(_state, 'deleting', ()))
+
+
+def _apply_to_shopping_lists(changes):
+    by_recipe = {}
+    for recipe_id, ingredient_id, amount in changes:
+        amounts = by_recipe.setdefault(recipe_id, {})
+        amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+    for recipe_id, amounts in by_recipe.items():
+        ShoppingListItem.apply_amounts(
+            amounts,
+            ShoppingCart.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('user_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    transaction.on_commit(bump_ingredient_index_version)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_catalog(sender, **kwargs):
+    transaction.on_commit(bump_tag_catalog_version)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+def _flush_cook_index():
+    recipe_ids, _state.cook_ids = _state.cook_ids, set()
+    if not recipe_ids:
+        return
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+    bump_cook_index_version()
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def invalidate_cook_index(sender, instance, **kwargs):
+    # Индекс догружает рецепты по updated_at, поэтому правка состава
+    # (например, из админки) должна его сдвигать: один UPDATE на все
+    # рецепты транзакции после коммита.
+    if not _tracks_composition(instance):
+        return
+    if not hasattr(_state, 'cook_ids'):
+        _state.cook_ids = set()
+    _state.cook_ids.add(instance.recipe_id)
+    transaction.on_commit(_flush_cook_index)
+
+
+def _refresh_search_vectors(recipe_ids):
+    # Копим рецепты до коммита и пересчитываем векторы одним UPDATE:
+    # первый сработавший on_commit забирает всё накопленное.
+    if not uses_full_text_search():
+        return
+    if not hasattr(_state, 'search_ids'):
+        _state.search_ids = set()
+    _state.search_ids.update(recipe_ids)
+    transaction.on_commit(_flush_search_vectors)
+
+
+def _flush_search_vectors():
+    recipe_ids, _state.search_ids = _state.search_ids, set()
+    if recipe_ids:
+        update_search_vector(recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe_search_vector(sender, instance, update_fields=None,
+                                 **kwargs):
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        _refresh_search_vectors([instance.pk])
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def refresh_composition_search_vector(sender, instance, **kwargs):
+    if _tracks_composition(instance):
+        _refresh_search_vectors([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_ingredient_search_vectors(sender, instance, created, **kwargs):
+    if not created:
+        _refresh_search_vectors(
+            IngredientRecipe.objects.filter(
+                ingredient=instance
+            ).values_list('recipe_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Recipe)
+def increment_counters(sender, instance, created, **kwargs):
+    if created:
+        adjust_counters(sender, [instance], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Recipe)
+def decrement_counters(sender, instance, **kwargs):
+    adjust_counters(sender, [instance], -1)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        schedule_fan_out(instance.pk)
+
+
+@receiver(post_save, sender=Subscription)
+def fill_timeline(sender, instance, created, **kwargs):
+    if created:
+        schedule_backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def clear_timeline(sender, instance, **kwargs):
+    remove_author_from_timeline(instance.user_id, instance.author_id)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    ShoppingListItem.apply_recipe(
+        instance.pk,
+        instance.shopping_cart.values_list('user_id', flat=True),
+        sign=-1
+    )
+    # Рецепт уже вычтен целиком: каскадное удаление его строк состава
+    # не должно вычитать их второй раз.
+    if not hasattr(_state, 'deleting'):
+        _state.deleting = set()
+    _state.deleting.add(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_deleted_recipe(sender, instance, **kwargs):
+    getattr(_state, 'deleting', set()).discard(instance.pk)
+
+
+def _flush_cook_index_deletions():
+    if getattr(_state, 'cook_deleted', False):
+        _state.cook_deleted = False
+        bump_cook_index_deletions()
+
+
+@receiver(post_delete, sender=Recipe)
+def drop_deleted_recipe_from_cook_index(sender, instance, **kwargs):
+    # Строки состава удаляются каскадом мимо invalidate_cook_index: индекс
+    # узнаёт об удалении по отдельной версии, одной на транзакцию.
+    _state.cook_deleted = True
+    transaction.on_commit(_flush_cook_index_deletions)
+
+
+@receiver(pre_save, sender=IngredientRecipe)
+def remember_composition_row(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None or not _tracks_composition(instance):
+        return
+    instance._saved_row = IngredientRecipe.objects.filter(
+        pk=instance.pk
+    ).values_list('recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientRecipe)
+def apply_saved_composition_row(sender, instance, raw=False, **kwargs):
+    saved_row = instance.__dict__.pop('_saved_row', None)
+    if raw or not _tracks_composition(instance):
+        return
+    changes = [(instance.recipe_id, instance.ingredient_id, instance.amount)]
+    if saved_row is not None:
+        recipe_id, ingredient_id, amount = saved_row
+        changes.append((recipe_id, ingredient_id, -amount))
+    _apply_to_shopping_lists(changes)
+
+
+@receiver(post_delete, sender=IngredientRecipe)
+def apply_deleted_composition_row(sender, instance, **kwargs):
+    if _tracks_composition(instance):
+        _apply_to_shopping_lists(
+            [(instance.recipe_id, instance.ingredient_id, -instance.amount)]
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, **kwargs):
+    schedule_image_variants(instance, 'image', 'image_variants',
+                            settings.RECIPE_IMAGE_SIZES)
+
+
+@receiver(post_save, sender=User)
+def process_avatar(sender, instance, **kwargs):
+    schedule_image_variants(instance, 'avatar', 'avatar_variants',
+                            settings.AVATAR_IMAGE_SIZES)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    name, variants = instance.image.name, instance.image_variants
+    transaction.on_commit(lambda: release_image(name, variants))
+
+
+@receiver(post_delete, sender=User)
+def release_avatar(sender, instance, **kwargs):
+    name, variants = instance.avatar.name, instance.avatar_variants
+    transaction.on_commit(lambda: release_image(name, variants))
@@ -0,0 +1,107 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .background import BackgroundTasks
+from .models import Recipe, Subscription, TimelineEntry
+
+# Ленту обрезаем не при каждой вставке, а когда она переросла лимит
+# на FEED_TRIM_SLACK записей.
+FEED_TRIM_SLACK = 50
+
+fanout_tasks = BackgroundTasks('FEED_FANOUT_WORKERS', 'feed-fanout',
+                               'Не удалось обновить ленты подписок')
+
+
+def is_fanned_out(subscribers_count):
+    return subscribers_count <= settings.FEED_FANOUT_MAX_SUBSCRIBERS
+
+
+def trim_timelines(user_ids):
+    overfull = TimelineEntry.objects.filter(
+        user_id__in=user_ids
+    ).values('user_id').annotate(total=Count('pk')).filter(
+        total__gt=settings.FEED_MAX_LENGTH + FEED_TRIM_SLACK
+    ).values_list('user_id', flat=True)
+    for user_id in overfull:
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        keep = entries.order_by('-created_at', '-recipe_id').values_list(
+            'pk', flat=True
+        )[:settings.FEED_MAX_LENGTH]
+        entries.exclude(pk__in=list(keep)).delete()
+
+
+def fan_out_recipe(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'author_id', 'created_at', 'author__subscribers_count'
+    ).first()
+    if recipe is None or not is_fanned_out(
+            recipe['author__subscribers_count']):
+        return
+    subscriber_ids = Subscription.objects.filter(
+        author_id=recipe['author_id']
+    ).order_by('pk').values_list('user_id', flat=True).iterator()
+    while True:
+        batch = list(islice(subscriber_ids,
+                            settings.FEED_FANOUT_BATCH_SIZE))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                           created_at=recipe['created_at'])
+             for user_id in batch],
+            ignore_conflicts=True
+        )
+        trim_timelines(batch)
+
+
+def backfill_timeline(user_id, author_id):
+    recipes = Recipe.objects.filter(
+        author_id=author_id, author__subscribers_count__lte=(
+            settings.FEED_FANOUT_MAX_SUBSCRIBERS)
+    ).order_by('-created_at', '-id').values_list(
+        'pk', 'created_at'
+    )[:settings.FEED_MAX_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                       created_at=created_at)
+         for recipe_id, created_at in recipes],
+        ignore_conflicts=True
+    )
+    trim_timelines([user_id])
+
+
+def schedule_fan_out(recipe_id):
+    fanout_tasks.run_on_commit(fan_out_recipe, recipe_id)
+
+
+def schedule_backfill(user_id, author_id):
+    fanout_tasks.run_on_commit(backfill_timeline, user_id,
+                               author_id)
+
+
+def remove_author_from_timeline(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def rebuild_timelines():
+    TimelineEntry.objects.all().delete()
+    subscriptions = Subscription.objects.filter(
+        author__subscribers_count__lte=settings.FEED_FANOUT_MAX_SUBSCRIBERS
+    ).values_list('user_id', 'author_id')
+    for user_id, author_id in subscriptions.iterator():
+        backfill_timeline(user_id, author_id)
+
+
+def timeline_filter(user):
+    # Рецепты из сохранённой ленты плюс рецепты популярных авторов,
+    # которые не раздаются подписчикам при публикации.
+    return Q(pk__in=user.timeline.values('recipe_id')) | Q(
+        author_id__in=user.subscriptions.filter(
+            author__subscribers_count__gt=(
+                settings.FEED_FANOUT_MAX_SUBSCRIBERS)
+        ).values('author_id')
+    )
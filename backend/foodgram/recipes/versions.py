@@ -0,0 +1,55 @@
+import time
+
+from django.core.cache import caches
+
+VERSIONS_CACHE_ALIAS = 'versions'
+# Сколько секунд процесс верит своей копии версии, не обращаясь к кэшу.
+VERSION_MEMO_SECONDS = 1
+CATALOG_VERSION_KEY = 'recipes:catalog_version'
+INGREDIENT_INDEX_VERSION_KEY = 'recipes:ingredient_index_version'
+COOK_INDEX_VERSION_KEY = 'recipes:cook_index_version'
+COOK_INDEX_DELETIONS_KEY = 'recipes:cook_index_deletions'
+TAG_CATALOG_VERSION_KEY = 'recipes:tag_catalog_version'
+
+
+def _initial_version():
+    # Если ключ вытеснен из кэша, новая версия не совпадёт со старыми.
+    return int(time.time() * 1000)
+
+
+# key -> (версия, момент, до которого ей можно верить)
+_memo = {}
+
+
+def _remember(key, version):
+    _memo[key] = (version, time.monotonic() + VERSION_MEMO_SECONDS)
+    return version
+
+
+def get_version(key):
+    # Версию читает каждый запрос к каталогам и индексам; за кэшем
+    # процесс ходит не чаще раза в VERSION_MEMO_SECONDS.
+    version, expires_at = _memo.get(key, (None, 0))
+    if time.monotonic() < expires_at:
+        return version
+    return _remember(key, caches[VERSIONS_CACHE_ALIAS].get_or_set(
+        key, _initial_version, None
+    ))
+
+
+def bump_version(key):
+    versions = caches[VERSIONS_CACHE_ALIAS]
+    try:
+        version = versions.incr(key)
+    except ValueError:
+        version = _initial_version()
+        versions.set(key, version, None)
+    _remember(key, version)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION_KEY)
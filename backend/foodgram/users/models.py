@@ -6,7 +6,23 @@ MAX_LENHT_USERNAME = 150
 MAX_LENGHT_AVATAR = 255
 
 
-class User(AbstractUser):
+class PreservedFieldsMixin:
+    # Поля из preserved_fields меняются только через UPDATE с F()
+    # (счётчики в recipes.counters), поэтому обычный save() их не пишет:
+    # устаревший экземпляр затёр бы чужие инкременты.
+    preserved_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = {*self.preserved_fields, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(PreservedFieldsMixin, AbstractUser):
     email = models.EmailField(unique=True, max_length=MAX_LENHT_NAME)
     username = models.CharField(max_length=MAX_LENHT_USERNAME, unique=True)
     first_name = models.CharField(max_length=MAX_LENHT_USERNAME)
@@ -14,6 +30,15 @@ class User(AbstractUser):
     avatar = models.ImageField(upload_to='avatars/', null=True,
                                blank=True,
                                max_length=MAX_LENGHT_AVATAR)
+    avatar_variants = models.JSONField(default=dict, blank=True,
+                                       editable=False)
+    recipes_count = models.PositiveIntegerField(default=0, editable=False,
+                                                verbose_name='Рецептов')
+    subscribers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Подписчиков'
+    )
+
+    preserved_fields = ('recipes_count', 'subscribers_count')
 
     def __str__(self):
         return self.username